@@ -0,0 +1,71 @@
+"""start-up time benchmark for `import odrunner`.
+
+runs `import odrunner` in fresh interpreters, and reports the median wall-clock
+time in JSON. exits with a non-zero status if the data model import pulled in
+a Qt binding, or if the median exceeds `--max-ms`.
+
+    python benchmarks/import_time.py [--repeat N] [--max-ms MS] [--output FILE]
+"""
+
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+PROBE = """
+import sys
+import odrunner
+qt = sorted(name for name in ('qtpy', 'PyQt5', 'PyQt6', 'PySide2', 'PySide6') if name in sys.modules)
+print(','.join(qt))
+"""
+
+def measure(repeat):
+    times = []
+    qt    = ''
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc  = subprocess.run([sys.executable, '-c', PROBE], cwd=str(ROOT),
+                               capture_output=True, text=True, check=True)
+        times.append((time.perf_counter() - start) * 1000)
+        qt = proc.stdout.strip()
+    baseline = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'pass'], check=True)
+        baseline.append((time.perf_counter() - start) * 1000)
+    return {
+        'benchmark':      'import_time',
+        'repeat':         repeat,
+        'median_ms':      statistics.median(times),
+        'interpreter_ms': statistics.median(baseline),
+        'import_ms':      statistics.median(times) - statistics.median(baseline),
+        'qt_modules':     [] if len(qt) == 0 else qt.split(','),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--max-ms', type=float, default=None,
+                        help='the upper limit of the import time (excluding the interpreter start-up)')
+    parser.add_argument('--output', default=None, help='the JSON file to write the result to')
+    args   = parser.parse_args()
+    result = measure(args.repeat)
+    text   = json.dumps(result, indent=2)
+    print(text)
+    if args.output is not None:
+        Path(args.output).write_text(text + '\n')
+    if len(result['qt_modules']) > 0:
+        print(f"error: 'import odrunner' loaded {', '.join(result['qt_modules'])}", file=sys.stderr)
+        return 1
+    if (args.max_ms is not None) and (result['import_ms'] > args.max_ms):
+        print(f"error: import took {result['import_ms']:.1f} ms (> {args.max_ms} ms)", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,222 @@
+"""benchmark suite for the hot paths of the core model and the table model.
+
+builds synthetic Subject/Session/Item trees of the given sizes, and measures:
+
+- Item construction
+- Entity.insert (and Entity.extend)
+- parse_time / format_time
+- LogDataModel.data / rowCount under the offscreen Qt platform (if available)
+- as_title(parents=True) on a deep tree
+- the peak memory for holding a tree
+
+the results are written in JSON, and can be compared against a previous run:
+
+    python benchmarks/run.py --sizes 1e3,1e4,1e5 --output bench.json
+    python benchmarks/run.py --compare bench.json
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tracemalloc
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from odrunner import core
+from odrunner.core import Item
+from odrunner.entities import Subject, Session
+
+CATEGORIES = ('Comment', 'Event', 'Reward', 'Stimulus', 'Error')
+
+def make_items(size):
+    return [Item(timestamp=f"2020-01-{1 + (i % 28):02d} {i % 24:02d}:{i % 60:02d}:00",
+                 category=CATEGORIES[i % len(CATEGORIES)],
+                 description=f"trial {i}") for i in range(size)]
+
+def make_tree(size, sessions=10):
+    """a subject with `sessions` sessions holding `size` items in total."""
+    subject = Subject(ID='BENCH-1', name='bench', species='mouse')
+    per     = max(1, size // sessions)
+    for index in range(sessions):
+        session = Session(subject, f"session-{index}")
+        session.extend(make_items(per))
+        subject.insert(session)
+    return subject
+
+def make_chain(depth):
+    """returns the deepest entity of a chain of `depth` nested entities."""
+    entity = Subject(ID='ROOT')
+    for index in range(depth):
+        child = Session(entity, f"level-{index}")
+        entity.insert(child)
+        entity = child
+    return entity
+
+def timed(func, repeat=3):
+    """returns the best wall-clock time of `repeat` calls to `func()`."""
+    best = None
+    for _ in range(repeat):
+        start   = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best    = elapsed if best is None else min(best, elapsed)
+    return best
+
+def bench_items(size):
+    stamps = [f"2020-01-01 00:00:{i % 60:02d}" for i in range(size)]
+    return timed(lambda: [Item(timestamp=stamp, description='x') for stamp in stamps])
+
+def bench_insert(size):
+    items = make_items(size)
+    def run():
+        session = Session(Subject(ID='x'), 'x')
+        for item in items:
+            session.insert(item)
+    return timed(run)
+
+def bench_extend(size):
+    items = make_items(size)
+    return timed(lambda: Session(Subject(ID='x'), 'x').extend(items))
+
+def bench_parse_time(size):
+    stamps = [f"2020-01-01 00:{i % 60:02d}:{i % 60:02d}" for i in range(size)]
+    return timed(lambda: [core.parse_time(stamp) for stamp in stamps])
+
+def bench_parse_times(size):
+    stamps = [f"2020-01-01 00:{i % 60:02d}:{i % 60:02d}" for i in range(size)]
+    return timed(lambda: core.parse_times(stamps))
+
+def bench_format_time(size):
+    times = core.parse_times(f"2020-01-01 00:{i % 60:02d}:{i % 60:02d}" for i in range(size))
+    return timed(lambda: [core.format_time(value) for value in times])
+
+def bench_title(size):
+    entity = make_chain(50)
+    return timed(lambda: [entity.as_title(parents=True) for _ in range(size)])
+
+def _qt_app():
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    try:
+        from qtpy import QtWidgets
+    except Exception:
+        return None
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+def bench_model_data(size):
+    if _qt_app() is None:
+        return None
+    from qtpy import QtCore
+    from odrunner.ui import LogDataModel
+    session = Session(Subject(ID='x'), 'x')
+    session.extend(make_items(size))
+    model   = LogDataModel(session, page_size=None)
+    indices = [model.index(row, column) for row in range(size) for column in range(3)]
+    role    = QtCore.Qt.DisplayRole
+    return timed(lambda: [model.data(index, role) for index in indices])
+
+def bench_model_rowcount(size):
+    if _qt_app() is None:
+        return None
+    from qtpy import QtCore
+    from odrunner.ui import LogDataModel
+    session = Session(Subject(ID='x'), 'x')
+    session.extend(make_items(size))
+    model   = LogDataModel(session)
+    root    = QtCore.QModelIndex()
+    return timed(lambda: [model.rowCount(root) for _ in range(size)])
+
+def bench_memory(size):
+    """returns the peak memory (in bytes) for building a tree."""
+    tracemalloc.start()
+    tree = make_tree(size)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del tree
+    return peak
+
+BENCHMARKS = {
+    'item_construction': bench_items,
+    'entity_insert':     bench_insert,
+    'entity_extend':     bench_extend,
+    'parse_time':        bench_parse_time,
+    'parse_times':       bench_parse_times,
+    'format_time':       bench_format_time,
+    'as_title_deep':     bench_title,
+    'model_data':        bench_model_data,
+    'model_rowcount':    bench_model_rowcount,
+}
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=str(ROOT),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(sizes, names):
+    results = []
+    for size in sizes:
+        for name in names:
+            seconds = BENCHMARKS[name](size)
+            if seconds is None:
+                print(f"{name:>20s} n={size:<8d} skipped (no Qt binding)", file=sys.stderr)
+                continue
+            results.append({'name': name, 'size': size, 'seconds': seconds,
+                            'ns_per_op': seconds / size * 1e9})
+            print(f"{name:>20s} n={size:<8d} {seconds * 1000:10.2f} ms "
+                  f"({seconds / size * 1e9:9.1f} ns/op)", file=sys.stderr)
+        peak = bench_memory(size)
+        results.append({'name': 'peak_memory', 'size': size, 'bytes': peak,
+                        'bytes_per_entry': peak / size})
+        print(f"{'peak_memory':>20s} n={size:<8d} {peak / 1e6:10.2f} MB "
+              f"({peak / size:9.1f} B/entry)", file=sys.stderr)
+    return {
+        'revision': git_revision(),
+        'python':   platform.python_version(),
+        'platform': platform.platform(),
+        'results':  results,
+    }
+
+def compare(current, previous):
+    """prints the ratio of each result to the one in `previous`."""
+    def key(result):
+        return (result['name'], result['size'])
+    before = dict((key(result), result) for result in previous['results'])
+    print(f"compared with revision {previous.get('revision')}:", file=sys.stderr)
+    for result in current['results']:
+        old = before.get(key(result), None)
+        if old is None:
+            continue
+        metric = 'seconds' if 'seconds' in result.keys() else 'bytes'
+        ratio  = result[metric] / old[metric] if old[metric] > 0 else float('nan')
+        print(f"{result['name']:>20s} n={result['size']:<8d} x{ratio:6.2f}", file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', default='1e3,1e4,1e5',
+                        help='comma-separated sizes (e.g. 1e3,1e4,1e5,1e6)')
+    parser.add_argument('--only', default=None,
+                        help='comma-separated names of the benchmarks to run')
+    parser.add_argument('--output', default=None, help='the JSON file to write the results to')
+    parser.add_argument('--compare', default=None, help='a JSON file from a previous run')
+    args   = parser.parse_args()
+    sizes  = [int(float(size)) for size in args.sizes.split(',')]
+    names  = list(BENCHMARKS.keys()) if args.only is None else args.only.split(',')
+    result = run(sizes, names)
+    text   = json.dumps(result, indent=2)
+    if args.output is not None:
+        Path(args.output).write_text(text + '\n')
+    else:
+        print(text)
+    if args.compare is not None:
+        compare(result, json.loads(Path(args.compare).read_text()))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
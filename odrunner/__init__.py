@@ -26,5 +26,22 @@ VERSION_STR = "1.0a1"
 
 from .core import Item, Block
 from .entities import Subject, Session
-from .ui import TableView, Browser
-from .ui import openEntity as open
+
+# the Qt-based UI is imported upon the first access to any of these names,
+# so that the data model can be used without any display stack.
+_ui_names = {
+    'TableView': 'TableView',
+    'Browser':   'Browser',
+    'open':      'openEntity',
+}
+
+def __getattr__(name):
+    if name in _ui_names.keys():
+        from . import ui
+        value = getattr(ui, _ui_names[name])
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(set(globals().keys()) | set(_ui_names.keys()))
@@ -0,0 +1,131 @@
+#
+# MIT License
+#
+# Copyright (c) 2019 Keisuke Sehara
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+"""saving journals in the background."""
+
+from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
+
+from qtpy import QtCore as _QtCore
+
+class AutoSaver(_QtCore.QObject):
+    """saves the changes recorded in a Journal on a worker thread.
+
+    the records to be written (the pending changes, or a snapshot of the
+    tree when the journal needs compaction) are taken on the GUI thread,
+    so that the worker never touches the entity tree. saving is debounced
+    by `delay` milliseconds, and a save is never started while another
+    one is in flight.
+    """
+    progress = _QtCore.Signal(str)      # message
+    saved    = _QtCore.Signal(str)      # path
+    failed   = _QtCore.Signal(str, str) # title, message
+    _done    = _QtCore.Signal(object)   # future
+
+    DEFAULT_DELAY = 2000
+
+    def __init__(self, journal, delay=DEFAULT_DELAY, parent=None):
+        super().__init__(parent=parent)
+        self._journal  = journal
+        self._executor = _ThreadPoolExecutor(max_workers=1)
+        self._inflight = None # (kind, records, future) of the save in flight
+        self._again    = False
+        self._timer    = _QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(delay)
+        self._timer.timeout.connect(self.saveNow)
+        self._done.connect(self._finished)
+        journal.root.add_observer(self._changed)
+
+    @property
+    def journal(self):
+        return self._journal
+
+    def isSaving(self):
+        return self._inflight is not None
+
+    def _changed(self, event, source, *args):
+        self.schedule()
+
+    def schedule(self):
+        """requests a save in `delay` milliseconds (unless one has been requested already)."""
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def saveNow(self):
+        """starts saving the changes immediately (or right after the save in flight)."""
+        self._timer.stop()
+        if self._inflight is not None:
+            self._again = True
+            return
+        journal = self._journal
+        if journal.needs_compaction():
+            kind, records = 'rewrite', journal.take_snapshot()
+        else:
+            kind, records = 'append', journal.take_pending()
+        if len(records) == 0:
+            return
+        self.progress.emit(f"saving {journal.path.name}...")
+        future = self._executor.submit(getattr(journal, kind), records)
+        self._inflight = (kind, records, future)
+        future.add_done_callback(self._done.emit)
+
+    def _settle(self):
+        """handles the result of the save in flight (which must have finished),
+        and returns the error (or None)."""
+        kind, records, future = self._inflight
+        self._inflight = None
+        error = future.exception()
+        if error is None:
+            self.saved.emit(str(self._journal.path))
+        else:
+            if kind == 'append':
+                self._journal.requeue(records)
+            # a failed rewrite makes the next save a snapshot again
+            self.failed.emit("Failed to save", f"{self._journal.path}: {error}")
+        return error
+
+    def _finished(self, future):
+        if (self._inflight is None) or (self._inflight[2] is not future):
+            # already handled in close()
+            return
+        error = self._settle()
+        if (self._again == True) or self._journal.has_changes():
+            self._again = False
+            if error is None:
+                self.saveNow()
+
+    def close(self, flush=True):
+        """stops observing the tree, and waits for the save in flight.
+        the remaining changes are saved synchronously if `flush` is True."""
+        self._timer.stop()
+        self._journal.root.remove_observer(self._changed)
+        self._executor.shutdown(wait=True)
+        if self._inflight is not None:
+            # the failed records must be requeued before the remaining ones are written
+            self._settle()
+        if (flush == True) and (self._journal.has_changes() or self._journal.needs_compaction()):
+            try:
+                self._journal.commit()
+            except OSError as e:
+                self.failed.emit("Failed to save", f"{self._journal.path}: {e}")
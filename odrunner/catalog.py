@@ -0,0 +1,199 @@
+#
+# MIT License
+#
+# Copyright (c) 2019 Keisuke Sehara
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+"""a local SQLite catalog of the subject logs.
+
+the catalog keeps the metadata of the subjects and their sessions
+(fields, start/end, the number of entries, and the last modification),
+so that subject logs can be listed and filtered without being loaded.
+"""
+
+import os as _os
+import datetime as _dt
+import sqlite3 as _sqlite3
+from pathlib import Path as _Path
+from collections import namedtuple as _namedtuple
+
+from . import core as _core
+from . import ids as _ids
+
+SubjectRecord = _namedtuple('SubjectRecord', ('uuid', 'path', 'ID', 'name', 'species', 'strain',
+                                              'DOB', 'sex', 'start', 'end', 'modified',
+                                              'entries', 'sessions'))
+SessionRecord = _namedtuple('SessionRecord', ('uuid', 'subject', 'name', 'start', 'end',
+                                              'modified', 'entries'))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS subjects (
+    uuid     TEXT PRIMARY KEY,
+    path     TEXT,
+    ID       TEXT,
+    name     TEXT,
+    species  TEXT,
+    strain   TEXT,
+    DOB      TEXT,
+    sex      TEXT,
+    start    TEXT,
+    end      TEXT,
+    modified TEXT,
+    entries  INTEGER,
+    sessions INTEGER
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    uuid     TEXT PRIMARY KEY,
+    subject  TEXT REFERENCES subjects(uuid) ON DELETE CASCADE,
+    name     TEXT,
+    start    TEXT,
+    end      TEXT,
+    modified TEXT,
+    entries  INTEGER
+);
+CREATE INDEX IF NOT EXISTS subjects_species ON subjects(species);
+CREATE INDEX IF NOT EXISTS subjects_strain  ON subjects(strain);
+CREATE INDEX IF NOT EXISTS sessions_subject ON sessions(subject);
+CREATE INDEX IF NOT EXISTS sessions_start   ON sessions(start);
+"""
+
+def default_path():
+    """the path to the catalog file, taken from $ODRUNNER_CATALOG if set."""
+    path = _os.environ.get('ODRUNNER_CATALOG', None)
+    if path is None:
+        path = _Path.home() / '.odrunner' / 'catalog.sqlite'
+    return _Path(path)
+
+def _time(value):
+    return None if value is None else _core.parse_time(value).isoformat(sep=' ')
+
+def _bound(value, until=False):
+    """returns the (operator, value) pair to compare `start` against the `since`/`until` bound.
+    dates (as parsed by parse_date(), i.e. at midnight) cover the whole day."""
+    if not isinstance(value, _dt.datetime):
+        if isinstance(value, _dt.date):
+            value = value.isoformat()
+        try:
+            value = _core.parse_time(value)
+        except ValueError:
+            value = _core.parse_date(value)
+    if until and (value.time() == _dt.time()):
+        return '<', _time(value + _dt.timedelta(days=1))
+    return ('<=' if until else '>='), _time(value)
+
+def _walk(entity):
+    for child in entity.children:
+        yield child
+        yield from _walk(child)
+
+class Catalog:
+    """the SQLite catalog of subject logs."""
+    def __init__(self, path=None):
+        self._path = default_path() if path is None else _Path(path)
+        if str(self._path) != ':memory:':
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = _sqlite3.connect(str(self._path))
+        self._db.execute("PRAGMA foreign_keys = ON")
+        self._db.executescript(_SCHEMA)
+
+    @property
+    def path(self):
+        return self._path
+
+    def close(self):
+        self._db.close()
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM subjects").fetchone()[0]
+
+    def update(self, subject, path):
+        """brings the records of `subject` (saved at `path`) up to date.
+        only the sessions whose `modified` has changed are rewritten."""
+        uuid     = _ids.format_id(subject.uuid)
+        path     = str(_Path(path).resolve())
+        sessions = list(_walk(subject))
+        with self._db:
+            # a record of the same file under another identifier form (e.g. older UUID strings)
+            self._db.execute("DELETE FROM subjects WHERE path = ? AND uuid != ?", (path, uuid))
+            # (not 'INSERT OR REPLACE', which would cascade to the sessions)
+            self._db.execute("""INSERT INTO subjects VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)
+                ON CONFLICT(uuid) DO UPDATE SET path=excluded.path, ID=excluded.ID,
+                    name=excluded.name, species=excluded.species, strain=excluded.strain,
+                    DOB=excluded.DOB, sex=excluded.sex, start=excluded.start, end=excluded.end,
+                    modified=excluded.modified, entries=excluded.entries,
+                    sessions=excluded.sessions""", (
+                uuid, path, subject.ID, subject.name,
+                subject.species, subject.strain, _time(subject.DOB), subject.sex,
+                _time(subject.start), _time(subject.end), _time(subject.modified),
+                len(subject), len(sessions)))
+            stored = dict(self._db.execute("SELECT uuid, modified FROM sessions WHERE subject = ?",
+                                           (uuid,)).fetchall())
+            for session in sessions:
+                key      = _ids.format_id(session.uuid)
+                modified = _time(session.modified)
+                if stored.pop(key, None) == modified:
+                    continue
+                self._db.execute("INSERT OR REPLACE INTO sessions VALUES (?,?,?,?,?,?,?)", (
+                    key, uuid, session.get_title(), _time(session.start), _time(session.end),
+                    modified, len(session)))
+            # the sessions that no longer exist
+            self._db.executemany("DELETE FROM sessions WHERE uuid = ?",
+                                 [(key,) for key in stored.keys()])
+
+    def remove(self, path):
+        """removes the subject saved at `path` from the catalog."""
+        with self._db:
+            self._db.execute("DELETE FROM subjects WHERE path = ?", (str(_Path(path).resolve()),))
+
+    def find_subjects(self, text=None, species=None, strain=None, since=None, until=None):
+        """returns the list of SubjectRecord objects that match all the criteria.
+
+        `text` is matched (as a substring) against ID and name, `species` and
+        `strain` (as substrings) against the respective fields, and `since`/`until`
+        select the subjects having a session that started within the range (either may be
+        a datetime or a date; a date `until` includes the whole day)."""
+        query  = "SELECT * FROM subjects WHERE 1"
+        params = []
+        if text is not None:
+            query += " AND (ID LIKE ? OR name LIKE ?)"
+            params += [f"%{text}%"] * 2
+        if species is not None:
+            query += " AND species LIKE ?"
+            params.append(f"%{species}%")
+        if strain is not None:
+            query += " AND strain LIKE ?"
+            params.append(f"%{strain}%")
+        if (since is not None) or (until is not None):
+            query += " AND uuid IN (SELECT subject FROM sessions WHERE 1"
+            for bound, upper in ((since, False), (until, True)):
+                if bound is not None:
+                    operator, value = _bound(bound, until=upper)
+                    query += f" AND start {operator} ?"
+                    params.append(value)
+            query += ")"
+        query += " ORDER BY ID"
+        return [SubjectRecord(*row) for row in self._db.execute(query, params)]
+
+    def find_sessions(self, subject):
+        """returns the list of SessionRecord objects of the subject (an identifier)."""
+        return [SessionRecord(*row) for row in self._db.execute(
+                "SELECT * FROM sessions WHERE subject = ? ORDER BY start",
+                (_ids.format_id(_ids.as_id(subject)),))]
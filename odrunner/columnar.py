@@ -0,0 +1,240 @@
+#
+# MIT License
+#
+# Copyright (c) 2019 Keisuke Sehara
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+"""a columnar storage for the log entries of an Entity.
+
+plain Item entries are decomposed into columns: timestamps as an int64
+array of epoch microseconds, categories as codes into a table of
+interned strings, and descriptions as indices into a string table.
+the entries are accessed through light-weight EntryView objects.
+
+to use the store, either set it as the `_logstore` of an Entity subclass,
+or convert an existing entity:
+
+    session.use_log_store(ColumnarLogs)
+"""
+
+import datetime as _dt
+from array import array as _array
+
+from . import core as _core
+
+_EPOCH   = _dt.datetime(1970, 1, 1)
+_USEC    = _dt.timedelta(microseconds=1)
+_NOTIME  = -(2**63)
+_MASK64  = (1 << 64) - 1
+
+def to_epoch(time):
+    """converts a (naive) datetime into epoch microseconds."""
+    return _NOTIME if time is None else (time - _EPOCH) // _USEC
+
+def from_epoch(value):
+    return None if value == _NOTIME else _EPOCH + _dt.timedelta(microseconds=value)
+
+class StringTable:
+    """a table of strings, each of which is stored only once."""
+    def __init__(self):
+        self._strings = []
+        self._codes   = {}
+
+    def __len__(self):
+        return len(self._strings)
+
+    def code(self, value):
+        code = self._codes.get(value, None)
+        if code is None:
+            code = len(self._strings)
+            self._strings.append(value)
+            self._codes[value] = code
+        return code
+
+    def get(self, code):
+        return self._strings[code]
+
+class EntryView(_core.BaseObject):
+    """a view of a log entry stored in ColumnarLogs.
+
+    it behaves as an Item with respect to get_field/set_field/for_display."""
+    __slots__ = ('_store', '_key')
+    _fields   = _core.Item._fields
+
+    def __init__(self, store, key):
+        self._store = store
+        self._key   = key
+
+    @property
+    def uuid(self):
+        return self._store.get_uuid(self._key)
+
+    def __eq__(self, other):
+        return isinstance(other, EntryView) and (self._store is other._store) \
+            and (self._key == other._key)
+
+    def __hash__(self):
+        return hash((id(self._store), self._key))
+
+    def is_block(self):
+        return False
+
+    def get_owner(self):
+        return self._store.owner
+
+    def as_item(self):
+        return _core.Item(uuid=self.uuid, **dict((name, self.get_field(name)) \
+                                                    for name in self._fields))
+
+    def get_field(self, name):
+        return self._store.get_value(self._key, name)
+
+    def set_field(self, name, value):
+        if name == 'timestamp':
+            value = _core.parse_time(value)
+        self._store.set_value(self._key, name, value)
+        self._store.owner.field_changed(self, name, value)
+
+    def as_str(self, name):
+        value = self.get_field(name)
+        if name == 'timestamp':
+            return _core.format_time(value)
+        else:
+            return str(value)
+
+class ColumnarLogs:
+    """a sequence of log entries stored in columns (see the module docstring).
+
+    entries other than plain Item objects (e.g. Blocks) are kept as they are."""
+    def __init__(self, owner):
+        self.owner        = owner
+        self._stamps      = _array('q')
+        self._categories  = _array('I')
+        self._descs       = _array('I')
+        self._idhigh      = _array('Q')
+        self._idlow       = _array('Q')
+        self._keys        = _array('Q')
+        self._objects     = {} # key --> entry object
+        self._category_table = StringTable()
+        self._string_table   = StringTable()
+        self._nextkey     = 0
+        self._shifted     = False # False as long as row == key
+        self._rows        = None  # key --> row; None when it has to be rebuilt
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __iter__(self):
+        for row in range(len(self._keys)):
+            yield self[row]
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[index] for index in range(*row.indices(len(self._keys)))]
+        key = self._keys[row]
+        obj = self._objects.get(key, None)
+        return EntryView(self, key) if obj is None else obj
+
+    def __setitem__(self, rows, entries):
+        """only supports insertion in the form of `store[index:index] = entries`."""
+        if (not isinstance(rows, slice)) or (rows.step not in (None, 1)) \
+            or (rows.start is None) or (rows.start != rows.stop):
+            raise ValueError("ColumnarLogs only supports insertion through slice assignment")
+        stamps     = _array('q')
+        categories = _array('I')
+        descs      = _array('I')
+        idhigh     = _array('Q')
+        idlow      = _array('Q')
+        keys       = _array('Q')
+        for entry in entries:
+            key = self._nextkey
+            self._nextkey += 1
+            if isinstance(entry, EntryView):
+                entry = entry.as_item()
+            if entry.__class__ is _core.Item:
+                uuid = entry.uuid
+                stamps.append(to_epoch(entry.get_field('timestamp')))
+                categories.append(self._category_table.code(entry.get_field('category')))
+                descs.append(self._string_table.code(entry.get_field('description')))
+                idhigh.append(uuid >> 64)
+                idlow.append(uuid & _MASK64)
+                entry._owner = None # the object itself is not retained
+            else:
+                stamps.append(_NOTIME)
+                categories.append(0)
+                descs.append(0)
+                idhigh.append(0)
+                idlow.append(0)
+                self._objects[key] = entry
+            keys.append(key)
+        size  = len(self._keys)
+        index = min(max(rows.start, 0), size)
+        self._stamps[index:index]     = stamps
+        self._categories[index:index] = categories
+        self._descs[index:index]      = descs
+        self._idhigh[index:index]     = idhigh
+        self._idlow[index:index]      = idlow
+        self._keys[index:index]       = keys
+        if index == size:
+            if self._rows is not None:
+                self._rows.update((key, index + offset) for offset, key in enumerate(keys))
+        else:
+            self._shifted = True
+            self._rows    = None
+
+    def _row(self, key):
+        if self._shifted == False:
+            return key
+        elif self._rows is None:
+            self._rows = dict((k, row) for row, k in enumerate(self._keys))
+        return self._rows[key]
+
+    def insert(self, index, entry):
+        size = len(self._keys)
+        if (index < 0) or (index > size):
+            index = size
+        self[index:index] = (entry,)
+
+    def get_uuid(self, key):
+        row = self._row(key)
+        return (self._idhigh[row] << 64) | self._idlow[row]
+
+    def get_value(self, key, name):
+        row = self._row(key)
+        if name == 'timestamp':
+            return from_epoch(self._stamps[row])
+        elif name == 'category':
+            return self._category_table.get(self._categories[row])
+        elif name == 'description':
+            return self._string_table.get(self._descs[row])
+        else:
+            raise AttributeError(name)
+
+    def set_value(self, key, name, value):
+        row = self._row(key)
+        if name == 'timestamp':
+            self._stamps[row] = to_epoch(value)
+        elif name == 'category':
+            self._categories[row] = self._category_table.code(value)
+        elif name == 'description':
+            self._descs[row] = self._string_table.code(value)
+        else:
+            raise AttributeError(f"not settable: {name}")
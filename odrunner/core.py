@@ -23,32 +23,119 @@
 #
 
 import datetime as _dt
-import uuid as _uuid
+from operator import attrgetter as _attrgetter
+from contextlib import contextmanager as _contextmanager
+from bisect import bisect_left as _bisect_left, bisect_right as _bisect_right
 
-DEBUG = True
+from . import trace as _trace
+from . import ids as _ids
 
 DEFAULT_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
 DEFAULT_DATE_FORMAT     = "%Y-%m-%d"
 
 def debug(msg, end='\n', flush=True):
-    if DEBUG == True:
-        import sys
-        print(msg, file=sys.stderr, end=end, flush=flush)
+    """emits `msg` as a 'debug' trace event (only when tracing is enabled)."""
+    if _trace.ENABLED:
+        _trace.event('debug', message=str(msg))
 
 def get_timestamp():
     return _dt.datetime.now()
 
+def _is_default_time(text):
+    """checks if `text` has the form of DEFAULT_DATETIME_FORMAT."""
+    return (len(text) == 19) and text.isascii() and (text[4] == '-') and (text[7] == '-') \
+        and (text[10] == ' ') and (text[13] == ':') and (text[16] == ':')
+
+def _is_default_date(text):
+    """checks if `text` has the form of DEFAULT_DATE_FORMAT."""
+    return (len(text) == 10) and text.isascii() and (text[4] == '-') and (text[7] == '-')
+
+def _time_parser(format):
+    """returns the function that parses a string in `format` into a datetime."""
+    if format == DEFAULT_DATETIME_FORMAT:
+        check = _is_default_time
+    elif format == DEFAULT_DATE_FORMAT:
+        check = _is_default_date
+    else:
+        return lambda text: _dt.datetime.strptime(text, format)
+
+    def _parse(text):
+        if check(text):
+            try:
+                return _dt.datetime.fromisoformat(text)
+            except ValueError:
+                pass
+        # let strptime() report the error (or deal with an unusual input)
+        return _dt.datetime.strptime(text, format)
+    return _parse
+
+def _time_formatter(format):
+    """returns the function that formats a datetime (or a date) in `format`."""
+    if format == DEFAULT_DATETIME_FORMAT:
+        def _format(time):
+            if isinstance(time, _dt.datetime) and (time.tzinfo is None):
+                return time.isoformat(sep=' ', timespec='seconds')
+            return time.strftime(format)
+    elif format == DEFAULT_DATE_FORMAT:
+        def _format(time):
+            if isinstance(time, _dt.datetime):
+                time = time.date()
+            return time.isoformat()
+    else:
+        def _format(time):
+            return time.strftime(format)
+    return _format
+
+_parse_default_time   = _time_parser(DEFAULT_DATETIME_FORMAT)
+_parse_default_date   = _time_parser(DEFAULT_DATE_FORMAT)
+_format_default_time  = _time_formatter(DEFAULT_DATETIME_FORMAT)
+
 def parse_time(time, format=DEFAULT_DATETIME_FORMAT):
     if not isinstance(time, _dt.datetime):
+        if format == DEFAULT_DATETIME_FORMAT:
+            return _parse_default_time(str(time))
         return _dt.datetime.strptime(str(time), format)
     else:
         return time
 
 def format_time(time, format=DEFAULT_DATETIME_FORMAT):
+    if format == DEFAULT_DATETIME_FORMAT:
+        return _format_default_time(time)
     return time.strftime(format)
 
 def parse_date(date, format=DEFAULT_DATE_FORMAT):
-    return _dt.datetime.strptime(str(date), format)
+    if not isinstance(date, _dt.datetime):
+        if format == DEFAULT_DATE_FORMAT:
+            return _parse_default_date(str(date))
+        return _dt.datetime.strptime(str(date), format)
+    else:
+        return date
+
+def parse_times(times, format=DEFAULT_DATETIME_FORMAT):
+    """parses the iterable of values into a list of datetime objects."""
+    parse = _time_parser(format)
+    return [time if isinstance(time, _dt.datetime) else parse(str(time)) for time in times]
+
+def format_times(times, format=DEFAULT_DATETIME_FORMAT):
+    """formats the iterable of datetime objects into a list of strings."""
+    return list(map(_time_formatter(format), times))
+
+def _field_property(name, direct=False):
+    """returns the property for the field `name`. `direct` means that
+    the value may be read from the `_<name>` attribute without get_field()."""
+    if direct == True:
+        getter = _attrgetter('_' + name)
+    else:
+        def getter(self):
+            return self.get_field(name)
+    def setter(self, value):
+        self.set_field(name, value)
+    return property(getter, setter, doc=f"the '{name}' field.")
+
+def _checked_setattr(self, name, value):
+    if (name[0] != '_') and (name != 'uuid') and (not hasattr(self.__class__, name)):
+        raise AttributeError(f"not settable: {name}")
+    object.__setattr__(self, name, value)
 
 class BaseObject:
     """
@@ -56,25 +143,33 @@ class BaseObject:
     get_field
     set_field
     as_str
+
+    `uuid` is an int identifier (see odrunner.ids), generated unless specified.
+    a uuid.UUID object or an identifier string is also accepted.
+
+    each of `_fields` is exposed as a property that is generated upon the
+    definition of the class, and that calls `get_field`/`set_field` (or reads
+    the `_<name>` attribute directly, if `get_field` is not overridden).
+    a class may define its own attribute of the same name instead.
+    setting any other public attribute raises AttributeError (natively,
+    for the classes defining `__slots__`).
     """
-    _fields = ()
+    __slots__ = ()
+    _fields   = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if '__slots__' not in cls.__dict__.keys():
+            # the instances have __dict__: a misspelled field must not end up as a new attribute
+            cls.__setattr__ = _checked_setattr
+        direct = (cls.get_field is BaseObject.get_field)
+        for name in cls._fields:
+            if name not in cls.__dict__.keys():
+                setattr(cls, name, _field_property(name, direct))
 
     def __init__(self, uuid=None):
-        self.uuid     = (_uuid.uuid1() if uuid is None else uuid)
+        self.uuid     = (_ids.new_id() if uuid is None else _ids.as_id(uuid))
 
-    def __getattr__(self, name):
-        if name in self._fields:
-            return self.get_field(name)
-        else:
-            raise AttributeError(name)
-
-    def __setattr__(self, name, value):
-        if (name == 'uuid') or (name.startswith('_')):
-            super().__setattr__(name, value)
-        elif name in self._fields:
-            self.set_field(name, value)
-        else:
-            raise AttributeError(f"not settable: {name}")
 
     def get_field(self, name):
         return getattr(self, '_'+name)
@@ -106,11 +201,13 @@ class Item(BaseObject):
     `display_field` method.
     """
 
-    _fields = ('timestamp', 'category', 'description')
+    __slots__ = ('uuid', '_owner', '_is_block', '_timestamp', '_category', '_description')
+    _fields   = ('timestamp', 'category', 'description')
 
     def __init__(self, timestamp=None, category=None, description=None,
                     uuid=None, is_block=False):
         super().__init__(uuid=uuid)
+        self._owner      = None
         self._is_block   = is_block
         if is_block == False:
             self._timestamp   = get_timestamp() if timestamp is None else parse_time(timestamp)
@@ -120,6 +217,14 @@ class Item(BaseObject):
     def is_block(self):
         return self._is_block
 
+    def get_owner(self):
+        """returns the Entity that this entry has been inserted to (or None)."""
+        return self._owner
+
+    def as_item(self):
+        """returns the standalone Item object for this entry."""
+        return self
+
     def as_str(self, name):
         value = getattr(self, '_'+name)
         if name == 'timestamp':
@@ -132,19 +237,20 @@ class Item(BaseObject):
             if not isinstance(value, _dt.datetime):
                 value = parse_time(value)
         super().set_field(name, value)
+        if self._owner is not None:
+            self._owner.field_changed(self, name, value)
 
 class Block(Item):
-    _fields = Item._fields + ('start', 'end',)
+    __slots__ = ('_content',)
+    _fields   = Item._fields + ('start', 'end',)
 
     def __init__(self, category=None, content=None, uuid=None):
         super().__init__(category=category, uuid=uuid, is_block=True)
         self._content = content
 
-    def __getattr__(self, name):
-        if name == 'content':
-            return self._content
-        else:
-            return super().__getattr__(name)
+    @property
+    def content(self):
+        return self._content
 
     def get_description(self):
         return "" if self._content is None else self._content.as_title()
@@ -186,12 +292,72 @@ class Block(Item):
         else:
             return str(getattr(self, '_'+name))
 
+class TimeIndex:
+    """a sorted index of the timestamps of log entries.
+
+    entries without any timestamp (e.g. blocks of an entity without
+    its start) are not indexed."""
+    def __init__(self, entries=()):
+        indexed       = [(entry.get_field('timestamp'), entry) for entry in entries]
+        indexed       = [item for item in indexed if item[0] is not None]
+        indexed.sort(key=lambda item: item[0])
+        self._times   = [time for time, _ in indexed]
+        self._entries = [entry for _, entry in indexed]
+        self._keys    = dict((entry.uuid, time) for time, entry in indexed) # uuid --> time
+
+    def __len__(self):
+        return len(self._times)
+
+    def add(self, entry):
+        time = entry.get_field('timestamp')
+        if time is None:
+            return
+        pos = _bisect_right(self._times, time)
+        self._times.insert(pos, time)
+        self._entries.insert(pos, entry)
+        self._keys[entry.uuid] = time
+
+    def remove(self, entry):
+        time = self._keys.pop(entry.uuid, None)
+        if time is None:
+            return
+        pos = _bisect_left(self._times, time)
+        while self._entries[pos].uuid != entry.uuid:
+            pos += 1
+        del self._times[pos]
+        del self._entries[pos]
+
+    def reindex(self, entry):
+        self.remove(entry)
+        self.add(entry)
+
+    def between(self, start, end):
+        """returns the entries with `start` <= timestamp <= `end`."""
+        return self._entries[_bisect_left(self._times, start):_bisect_right(self._times, end)]
+
+    def at_or_before(self, time):
+        pos = _bisect_right(self._times, time)
+        return None if pos == 0 else self._entries[pos - 1]
+
+    def first(self):
+        return self._times[0] if len(self._times) > 0 else None
+
+    def last(self):
+        return self._times[-1] if len(self._times) > 0 else None
+
+class _Batch:
+    def __init__(self):
+        self.depth = 0
+        self.dirty = {} # id --> the entity whose update has been deferred
+
 class Entity(BaseObject):
     _fields     = ('start', 'end', 'modified',)
     _block      = 'Entity'
     _stamp      = 'datetime'
     _entrycls   = Item
     _parentname = None
+    _logstore   = None # the factory `store(entity)` for the log storage (None for a list)
+    _titlefields = ('ID', 'name') # the fields that get_title() depends on
 
     @classmethod
     def parse_start(cls, start):
@@ -217,21 +383,36 @@ class Entity(BaseObject):
         self._start    = self.__class__.parse_start(start)
         self._end      = self.__class__.parse_end(end)
         self._modified = (get_timestamp() if modified is None else parse_time(modified))
-        self._parent   = parent
-        self._children = []
-        self._logs     = []
-
-    def __getattr__(self, name):
-        if name == 'logs':
-            return self._logs
-        elif name == 'title':
-            return self.get_title()
-        elif name == 'children':
-            return self._children
-        elif name == self._parentname:
-            return self._parent
-        else:
-            return super().__getattr__(name)
+        self._parent    = parent
+        self._children  = []
+        self._childmap  = {} # uuid --> child entity
+        self._blocks    = {} # uuid of the child --> its block entry
+        self._logs      = [] if self._logstore is None else self._logstore(self)
+        self._observers = []
+        self._timeindex = None # built upon the first time-based query
+        self._batch     = None
+        self._title     = None # the cached title (see as_title())
+        self._fulltitle = None # the cached title including the parents
+
+    def __init_subclass__(cls, **kwargs):
+        explicit = cls._parentname in cls.__dict__.keys()
+        super().__init_subclass__(**kwargs)
+        if (cls._parentname is not None) and (explicit == False):
+            # the parent is not stored as a field
+            setattr(cls, cls._parentname, property(_attrgetter('_parent'),
+                                                   doc="the parent entity."))
+
+    @property
+    def logs(self):
+        return self._logs
+
+    @property
+    def title(self):
+        return self.as_title()
+
+    @property
+    def children(self):
+        return self._children
 
     def __len__(self):
         return len(self._logs)
@@ -248,26 +429,243 @@ class Entity(BaseObject):
     def get_end(self):
         return self.end
 
+    def get_parent(self):
+        return self._parent
+
+    def get_child(self, uuid):
+        """returns the child entity with `uuid` (an identifier in any form; see odrunner.ids)."""
+        return self._childmap.get(_ids.as_id(uuid), None)
+
+    def has_child(self, child):
+        return child.uuid in self._childmap.keys()
+
+    def get_block(self, child):
+        """returns the log entry that represents `child` (or None)."""
+        return self._blocks.get(child.uuid, None)
+
     def get_entry(self, index):
         return self._logs[index]
 
     def get_title(self):
         return "(untitled)"
 
-    def insert(self, entry, index=-1):
-        if index < 0:
-            index = len(self._logs)
+    def add_observer(self, observer):
+        """registers `observer(event, source, *args)` to be called
+        upon any change in this entity or in its descendants.
+
+        the events being currently notified are:
+
+        - `('insert', source, entries, index)`
+        - `('set', source, target, name, value)`
+        - `('update', source, modified)`
+        - `('batch', source, modified)` (see `batch()`; this one is not
+          notified to the observers of the ancestors)
+        """
+        if observer not in self._observers:
+            self._observers.append(observer)
+
+    def remove_observer(self, observer):
+        if observer in self._observers:
+            self._observers.remove(observer)
+
+    def notify(self, event, source, *args):
+        for observer in tuple(self._observers):
+            observer(event, source, *args)
+        if isinstance(self._parent, Entity):
+            self._parent.notify(event, source, *args)
+
+    def as_log_entry(self, entry):
+        """validates `entry` and returns the Item to be stored in the logs."""
         if isinstance(entry, Entity):
-            self.insert(entry.as_entry(), index=index)
-            if entry not in self._children:
-                self._children.append(entry)
+            entry = entry.as_entry()
         elif not isinstance(entry, self._entrycls):
             raise ValueError(f"expected {self._entrycls.__name__}, got {entry.__class__.__name__}")
-        else:
-            self._logs.insert(index, entry)
+        if entry.is_block() and isinstance(entry.content, Entity):
+            child = entry.content
+            if child.uuid not in self._childmap.keys():
+                self._children.append(child)
+                self._childmap[child.uuid] = child
+            self._blocks[child.uuid] = entry
+            if child._parent is None:
+                child._parent = self
+                child._invalidate_titles(own=False)
+        return entry
+
+    def place(self, entry, index=-1):
+        """inserts `entry` to the logs without notifying or updating.
+        returns the Item that has been actually stored."""
+        if (index < 0) or (index > len(self._logs)):
+            index = len(self._logs)
+        entry = self.as_log_entry(entry)
+        entry._owner = self
+        self._logs.insert(index, entry)
+        entry = self._logs[index]
+        if self._timeindex is not None:
+            self._timeindex.add(entry)
+        return entry
+
+    def place_many(self, entries, index=-1):
+        """inserts `entries` to the logs at once, without notifying or updating.
+        returns the list of Items that have been actually stored."""
+        if (index < 0) or (index > len(self._logs)):
+            index = len(self._logs)
+        for entry in entries:
+            if not isinstance(entry, (Entity, self._entrycls)):
+                raise ValueError(f"expected {self._entrycls.__name__}, got {entry.__class__.__name__}")
+        entries = [self.as_log_entry(entry) for entry in entries]
+        for entry in entries:
+            entry._owner = self
+        self._logs[index:index] = entries
+        entries = self._logs[index:index + len(entries)]
+        if self._timeindex is not None:
+            if len(entries) > 64:
+                self._timeindex = None # to be rebuilt upon the next query
+            else:
+                for entry in entries:
+                    self._timeindex.add(entry)
+        return entries
+
+    def use_log_store(self, factory):
+        """replaces the storage of the log entries with `factory(self)`
+        (or with a plain list in case `factory` is None)."""
+        logs = [] if factory is None else factory(self)
+        for entry in self._logs:
+            entry = entry.as_item()
+            entry._owner = self
+            logs.insert(len(logs), entry)
+        self._logs      = logs
+        self._timeindex = None
+
+    def insert(self, entry, index=-1):
+        if index < 0:
+            index = len(self._logs)
+        entry = self.place(entry, index=index)
+        if _trace.ENABLED:
+            _trace.count('entity.insert')
+        self.notify('insert', self, [entry], index)
+        self.update()
+
+    def extend(self, entries, index=-1):
+        """inserts `entries` at `index` (or at the end) in a single operation."""
+        if (index < 0) or (index > len(self._logs)):
+            index = len(self._logs)
+        entries = self.place_many(list(entries), index=index)
+        if len(entries) > 0:
+            if _trace.ENABLED:
+                _trace.count('entity.insert', len(entries))
+            self.notify('insert', self, entries, index)
+            self.update()
+
+    def set_field(self, name, value):
+        if name in ('start', 'end'):
+            # parsed as in the constructor (but None is kept as None)
+            value = self.__class__.parse_end(value)
+        super().set_field(name, value)
+        self.field_changed(self, name, value)
+
+    def field_changed(self, target, name, value):
+        """called when a field of this entity (or of one of its entries) has changed."""
+        if (target is self) and (name in self._titlefields):
+            self._invalidate_titles()
+        if name in ('timestamp', 'start'):
+            if (target is not self) and (self._timeindex is not None):
+                self._timeindex.reindex(target)
+            elif (target is self) and isinstance(self._parent, Entity):
+                self._parent._reindex_child(self)
+        self.notify('set', self, target, name, value)
+        if name != 'modified':
+            self.update()
+
+    def _reindex_child(self, child):
+        if (self._timeindex is not None) and (child.uuid in self._blocks.keys()):
+            self._timeindex.reindex(self._blocks[child.uuid])
+
+    def time_index(self):
+        """returns the TimeIndex of the log entries (built when necessary)."""
+        if self._timeindex is None:
+            self._timeindex = TimeIndex(self._logs)
+        return self._timeindex
+
+    def entries_between(self, start, end):
+        """returns the log entries with `start` <= timestamp <= `end`, in the order of time."""
+        return self.time_index().between(parse_time(start), parse_time(end))
+
+    def entry_at_or_before(self, time):
+        """returns the latest log entry at or before `time` (or None)."""
+        return self.time_index().at_or_before(parse_time(time))
+
+    def first_timestamp(self):
+        return self.time_index().first()
+
+    def last_timestamp(self):
+        return self.time_index().last()
+
+    def _active_batch(self):
+        entity = self
+        while isinstance(entity, Entity):
+            if entity._batch is not None:
+                return entity._batch
+            entity = entity._parent
+        return None
+
+    def in_batch(self):
+        """returns whether this entity is being modified inside a `batch()` block."""
+        return self._active_batch() is not None
+
+    @_contextmanager
+    def batch(self):
+        """a context in which the updates of this entity and its descendants
+        are deferred. when the (outermost) block exits, `modified` is set once
+        for every affected entity and its ancestors, and then a single
+        'batch' event is notified to the observers of each of them:
+
+            with subject.batch():
+                for entry in entries:
+                    session.insert(entry)
+        """
+        if self._batch is None:
+            self._batch = _Batch()
+        self._batch.depth += 1
+        try:
+            yield self
+        finally:
+            self._batch.depth -= 1
+            if self._batch.depth == 0:
+                self._end_batch()
+
+    def _end_batch(self):
+        batch = self._batch
+        outer = self._parent._active_batch() if isinstance(self._parent, Entity) else None
+        if outer is not None:
+            # leave it to the outer batch
+            outer.dirty.update(batch.dirty)
+            self._batch = None
+            return
+        modified = get_timestamp()
+        affected = {}
+        for entity in batch.dirty.values():
+            while isinstance(entity, Entity) and (id(entity) not in affected.keys()):
+                affected[id(entity)] = entity
+                entity = entity._parent
+        try:
+            for entity in affected.values():
+                entity._modified = modified
+                entity.notify('update', entity, modified)
+        finally:
+            self._batch = None
+        for entity in affected.values():
+            for observer in tuple(entity._observers):
+                observer('batch', entity, modified)
 
     def update(self):
-        self.modified = get_timestamp()
+        batch = self._active_batch()
+        if batch is not None:
+            batch.dirty[id(self)] = self
+            return
+        if _trace.ENABLED:
+            _trace.count('entity.update')
+        self._modified = get_timestamp()
+        self.notify('update', self, self._modified)
         if isinstance(self._parent, Entity):
             self._parent.update()
 
@@ -279,6 +677,20 @@ class Entity(BaseObject):
             return str(value)
 
     def as_title(self, parents=False):
+        """returns the title (see get_title()), optionally prefixed with
+        those of the parents. the values are cached until any of
+        `_titlefields` changes in this entity or in its ancestors."""
         if (parents == True) and isinstance(self._parent, Entity):
-            return self._parent.as_title(parents=True) + " :: " + self.title
-        return self.title
+            if self._fulltitle is None:
+                self._fulltitle = self._parent.as_title(parents=True) + " :: " + self.as_title()
+            return self._fulltitle
+        if self._title is None:
+            self._title = self.get_title()
+        return self._title
+
+    def _invalidate_titles(self, own=True):
+        if own == True:
+            self._title = None
+        self._fulltitle = None
+        for child in self._children:
+            child._invalidate_titles(own=False)
@@ -0,0 +1,161 @@
+#
+# MIT License
+#
+# Copyright (c) 2019 Keisuke Sehara
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+"""streaming export of entity trees into open-data formats.
+
+the rows are generated while walking the tree, so that the memory use
+does not depend on the size of the logs. supported formats are CSV,
+JSON Lines, and Parquet (the latter requires `pyarrow`).
+"""
+
+import csv as _csv
+import json as _json
+from pathlib import Path as _Path
+from concurrent.futures import ProcessPoolExecutor as _ProcessPoolExecutor
+
+from . import ids as _ids
+
+COLUMNS = ('path', 'uuid', 'kind', 'category', 'timestamp', 'start', 'end', 'description')
+FORMATS = {
+    '.csv':     'csv',
+    '.jsonl':   'jsonl',
+    '.parquet': 'parquet',
+}
+
+def _isoformat(time):
+    return None if time is None else time.isoformat()
+
+def iter_rows(entity):
+    """generates a row (dict with the keys in COLUMNS) for every entry
+    in `entity` and its descendants, in the depth-first order."""
+    path = entity.as_title(parents=True)
+    for entry in entity.logs:
+        if entry.is_block():
+            content = entry.content
+            yield {
+                'path':        path,
+                'uuid':        _ids.format_id(entry.uuid),
+                'kind':        'block',
+                'category':    entry.get_field('category'),
+                'timestamp':   _isoformat(entry.get_start()),
+                'start':       _isoformat(entry.get_start()),
+                'end':         _isoformat(entry.get_end()),
+                'description': entry.get_description(),
+            }
+            if content is not None:
+                yield from iter_rows(content)
+        else:
+            yield {
+                'path':        path,
+                'uuid':        _ids.format_id(entry.uuid),
+                'kind':        'item',
+                'category':    entry.get_field('category'),
+                'timestamp':   _isoformat(entry.get_field('timestamp')),
+                'start':       None,
+                'end':         None,
+                'description': str(entry.get_field('description')),
+            }
+
+def write_csv(entity, path):
+    with open(path, 'w', newline='', encoding='utf-8') as out:
+        writer = _csv.DictWriter(out, fieldnames=COLUMNS)
+        writer.writeheader()
+        for row in iter_rows(entity):
+            writer.writerow(row)
+
+def write_jsonl(entity, path):
+    with open(path, 'w', encoding='utf-8') as out:
+        for row in iter_rows(entity):
+            out.write(_json.dumps(row, ensure_ascii=False) + '\n')
+
+def write_parquet(entity, path, batch_size=10000):
+    try:
+        import pyarrow as _pa
+        import pyarrow.parquet as _pq
+    except ImportError:
+        raise ImportError("exporting into Parquet requires 'pyarrow' to be installed")
+    schema = _pa.schema([(column, _pa.string()) for column in COLUMNS])
+    with _pq.ParquetWriter(str(path), schema) as writer:
+        batch = []
+        for row in iter_rows(entity):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                writer.write_table(_pa.Table.from_pylist(batch, schema=schema))
+                batch = []
+        if len(batch) > 0:
+            writer.write_table(_pa.Table.from_pylist(batch, schema=schema))
+
+_writers = {
+    'csv':     write_csv,
+    'jsonl':   write_jsonl,
+    'parquet': write_parquet,
+}
+
+def export(entity, path, format=None):
+    """writes the entries of `entity` and its descendants to `path`.
+    `format` ('csv', 'jsonl' or 'parquet') defaults to the one for the file suffix."""
+    if format is None:
+        suffix = _Path(path).suffix.lower()
+        if suffix not in FORMATS.keys():
+            raise ValueError(f"cannot infer the export format from: {path}")
+        format = FORMATS[suffix]
+    if format not in _writers.keys():
+        raise ValueError(f"unknown export format: {format}")
+    _writers[format](entity, path)
+
+def _export_file(source, target, format):
+    from . import storage
+    # (not storage.load(), which may rewrite a journal with a truncated tail)
+    root = storage.read(source)[0].finish()
+    export(root, target, format=format)
+    return str(target)
+
+def _target_paths(sources, outdir, format):
+    """returns the output path for each source, numbering the ones with the same name."""
+    targets = []
+    used    = set()
+    for source in sources:
+        stem  = _Path(source).stem
+        name  = stem
+        count = 1
+        while name in used:
+            count += 1
+            name = f"{stem}-{count}"
+        used.add(name)
+        targets.append(str(_Path(outdir) / (name + '.' + format)))
+    return targets
+
+def export_files(sources, outdir, format='csv', processes=None):
+    """exports each journal file in `sources` into `outdir` in parallel,
+    using a pool of `processes` worker processes. the source files are only read.
+    the files with the same name (in different directories) are exported as
+    '<name>-2', '<name>-3' etc. in the order of `sources`.
+    returns the list of paths to the exported files."""
+    if format not in _writers.keys():
+        raise ValueError(f"unknown export format: {format}")
+    _Path(outdir).mkdir(parents=True, exist_ok=True)
+    sources = [str(source) for source in sources]
+    targets = _target_paths(sources, outdir, format)
+    with _ProcessPoolExecutor(max_workers=processes) as pool:
+        return list(pool.map(_export_file, sources, targets, [format] * len(sources)))
@@ -0,0 +1,131 @@
+#
+# MIT License
+#
+# Copyright (c) 2019 Keisuke Sehara
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+"""identifiers of the log entries and entities.
+
+identifiers are plain ints. by default, they are generated as time-ordered
+128-bit values (similar to ULID: 48 bits of milliseconds since the epoch,
+followed by random bits), handed out from consecutive blocks so that
+generating one costs little more than an increment.
+
+the canonical string form is the 26-character Crockford base32 encoding
+(as in ULID). `as_id()` also accepts uuid.UUID objects and the usual UUID
+strings, so that identifiers from older journal files remain valid.
+"""
+
+import os as _os
+import time as _time
+import uuid as _uuid
+import threading as _threading
+
+_CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_PAIRS     = [a + b for a in _CROCKFORD for b in _CROCKFORD] # 10 bits --> 2 characters
+_SHIFTS    = tuple(range(120, -1, -10))
+_DIGITS    = str.maketrans(dict([(c, "0123456789abcdefghijklmnopqrstuv"[i]) \
+                                  for i, c in enumerate(_CROCKFORD)]
+                                + [('I', '1'), ('L', '1'), ('O', '0')]))
+_MAX_ID    = (1 << 128) - 1
+
+class TimeOrderedIDs:
+    """generates time-ordered, `bits`-bit identifiers (48 bits of milliseconds,
+    followed by random bits), reserving `block` consecutive values at a time.
+
+    identifiers are increasing within a process, even if the clock goes back.
+    """
+    def __init__(self, bits=128, block=4096):
+        if (bits < 64) or (bits > 128):
+            raise ValueError(f"bits must be within 64 and 128, got {bits}")
+        self._random = bits - 48
+        self._span   = (1 << self._random) - block
+        if self._span <= 0:
+            raise ValueError(f"block size too large: {block}")
+        self._block  = block
+        self._lock   = _threading.Lock()
+        self._next   = 0
+        self._limit  = 0
+        if hasattr(_os, 'register_at_fork'):
+            # the child process must not hand out the rest of the current block
+            _os.register_at_fork(after_in_child=self._discard)
+
+    def _discard(self):
+        self._next = self._limit
+
+    def _refill(self):
+        msec   = _time.time_ns() // 1_000_000
+        offset = int.from_bytes(_os.urandom(16), 'big') % self._span
+        base   = max((msec << self._random) | offset, self._limit)
+        self._next  = base
+        self._limit = base + self._block
+
+    def __call__(self):
+        with self._lock:
+            if self._next >= self._limit:
+                self._refill()
+            value = self._next
+            self._next += 1
+            return value
+
+def uuid1_ids():
+    """the legacy generator (the uuid1 value as an int)."""
+    return _uuid.uuid1().int
+
+_generator = TimeOrderedIDs()
+
+def set_generator(generator):
+    """sets the callable that returns a new identifier (as an int),
+    and returns the previous one."""
+    global _generator
+    previous, _generator = _generator, generator
+    return previous
+
+def new_id():
+    return _generator()
+
+def as_id(value):
+    """converts `value` (an int, a uuid.UUID, or a string) into an identifier."""
+    if value.__class__ is int:
+        return value
+    elif isinstance(value, str):
+        return parse_id(value)
+    elif isinstance(value, _uuid.UUID):
+        return value.int
+    elif isinstance(value, int):
+        return int(value)
+    raise TypeError(f"not an identifier: {value!r}")
+
+def format_id(value):
+    """returns the canonical (26-character) string form of the identifier."""
+    return ''.join([_PAIRS[(value >> shift) & 1023] for shift in _SHIFTS])
+
+def parse_id(text):
+    """parses the canonical string form (or a UUID string) into an identifier."""
+    if len(text) == 26:
+        try:
+            value = int(text.upper().translate(_DIGITS), 32)
+        except ValueError:
+            raise ValueError(f"not an identifier: {text!r}") from None
+        if value > _MAX_ID:
+            raise ValueError(f"identifier out of range: {text!r}")
+        return value
+    return _uuid.UUID(text).int
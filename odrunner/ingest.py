@@ -0,0 +1,371 @@
+#
+# MIT License
+#
+# Copyright (c) 2019 Keisuke Sehara
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+"""a local ingestion endpoint for live event logging.
+
+clients connect through a Unix socket or TCP, and send length-prefixed
+frames (a 4-byte big-endian length followed by a JSON or msgpack payload),
+each containing a message such as:
+
+    {"id": 1, "session": "<identifier>", "events": [
+        {"timestamp": "2020-01-01T12:00:00.250", "category": "Reward", "description": "..."},
+        ...
+    ]}
+
+(a single event may also be given in place of "events"). timestamps are
+ISO-format strings or epoch seconds, and default to the time of arrival.
+
+the events are appended to the target entity (resolved by its identifier)
+as Items, in batches of consecutive messages. every message is then answered
+with an acknowledgement frame: {"id": 1, "ok": true, "uuids": [...]} once
+the entries have been persisted to the journal (if any), or
+{"id": 1, "ok": false, "error": "..."} on failure.
+
+at most `max_pending` messages are queued; connections stop being read
+while the queue is full, which propagates the back-pressure to the clients.
+
+the entity tree is modified on the thread running the event loop.
+"""
+
+import json as _json
+import struct as _struct
+import asyncio as _asyncio
+import datetime as _dt
+
+from . import core as _core
+from . import ids as _ids
+from . import trace as _trace
+
+DEFAULT_MAX_PENDING = 1000
+DEFAULT_BATCH_SIZE  = 5000 # events
+MAX_FRAME_SIZE      = 16 * 1024 * 1024
+
+_HEADER = _struct.Struct('>I')
+
+class ProtocolError(ValueError):
+    pass
+
+class JSONCodec:
+    name = 'json'
+
+    @staticmethod
+    def encode(obj):
+        return _json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    @staticmethod
+    def decode(payload):
+        return _json.loads(payload.decode('utf-8'))
+
+class MsgpackCodec:
+    name = 'msgpack'
+
+    def __init__(self):
+        try:
+            import msgpack as _msgpack
+        except ImportError:
+            raise ImportError("the msgpack codec requires 'msgpack' to be installed")
+        self._msgpack = _msgpack
+
+    def encode(self, obj):
+        return self._msgpack.packb(obj, use_bin_type=True)
+
+    def decode(self, payload):
+        return self._msgpack.unpackb(payload, raw=False)
+
+def get_codec(codec):
+    """returns the codec object for the name `codec` ('json' or 'msgpack')."""
+    if codec == 'json':
+        return JSONCodec()
+    elif codec == 'msgpack':
+        return MsgpackCodec()
+    elif hasattr(codec, 'encode') and hasattr(codec, 'decode'):
+        return codec
+    raise ValueError(f"unknown codec: {codec}")
+
+async def read_frame(reader, codec):
+    """reads a frame from `reader`, and returns the decoded message
+    (or None at the end of the stream)."""
+    try:
+        header = await reader.readexactly(_HEADER.size)
+    except _asyncio.IncompleteReadError as e:
+        if len(e.partial) == 0:
+            return None
+        raise ProtocolError("incomplete frame header")
+    size = _HEADER.unpack(header)[0]
+    if size > MAX_FRAME_SIZE:
+        raise ProtocolError(f"frame too large: {size} bytes")
+    try:
+        payload = await reader.readexactly(size)
+    except _asyncio.IncompleteReadError:
+        raise ProtocolError("incomplete frame")
+    return codec.decode(payload)
+
+def write_frame(writer, codec, message):
+    payload = codec.encode(message)
+    writer.write(_HEADER.pack(len(payload)) + payload)
+
+def parse_timestamp(value):
+    """converts the timestamp of an event into a naive datetime in the local time
+    (None stays None)."""
+    if isinstance(value, (int, float)):
+        return _dt.datetime.fromtimestamp(value)
+    elif isinstance(value, str):
+        try:
+            value = _dt.datetime.fromisoformat(value)
+        except ValueError:
+            value = _core.parse_time(value)
+    elif (value is not None) and (not isinstance(value, _dt.datetime)):
+        raise ValueError(f"invalid timestamp: {value!r}")
+    if (value is not None) and (value.tzinfo is not None):
+        # the logs hold naive timestamps
+        value = value.astimezone().replace(tzinfo=None)
+    return value
+
+class _Message:
+    __slots__ = ('writer', 'id', 'target', 'events')
+
+    def __init__(self, writer, id, target, events):
+        self.writer = writer
+        self.id     = id
+        self.target = target
+        self.events = events
+
+class IngestServer:
+    """appends the events received from clients to the entities.
+
+    `resolve(identifier)` returns the target entity (e.g. Registry.resolve),
+    or None if there is no such entity. if `journal` is given, the inserted
+    entries are saved (on a worker thread, as in the autosaver) before
+    the acknowledgement is sent.
+    """
+    def __init__(self, resolve, journal=None, codec='json',
+                 max_pending=DEFAULT_MAX_PENDING, batch_size=DEFAULT_BATCH_SIZE):
+        self._resolve    = resolve
+        self._journal    = journal
+        self._codec      = get_codec(codec)
+        self._batch_size = batch_size
+        self._queue      = _asyncio.Queue(maxsize=max_pending)
+        self._server     = None
+        self._task       = None
+        self._clients    = set()
+
+    @property
+    def sockets(self):
+        return () if self._server is None else self._server.sockets
+
+    async def start(self, path=None, host='127.0.0.1', port=0):
+        """starts listening on the Unix socket at `path`, or on TCP `host`:`port`."""
+        if path is not None:
+            self._server = await _asyncio.start_unix_server(self._serve, path=str(path))
+        else:
+            self._server = await _asyncio.start_server(self._serve, host=host, port=port)
+        self._task = _asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    async def close(self):
+        """stops accepting messages, and waits until the queued ones are processed."""
+        if self._server is None:
+            return
+        self._server.close()
+        await self._server.wait_closed()
+        for writer in tuple(self._clients):
+            writer.close()
+        await self._queue.put(None)
+        await self._task
+        self._server = None
+
+    async def _serve(self, reader, writer):
+        self._clients.add(writer)
+        try:
+            while True:
+                try:
+                    message = await read_frame(reader, self._codec)
+                except (ProtocolError, ValueError) as e:
+                    write_frame(writer, self._codec, {'id': None, 'ok': False, 'error': str(e)})
+                    break
+                if message is None:
+                    break
+                if not isinstance(message, dict):
+                    write_frame(writer, self._codec, {'id': None, 'ok': False,
+                                                      'error': "expected a map"})
+                    continue
+                events = message.get('events', None)
+                if events is None:
+                    events = [message]
+                # waits while the queue is full (i.e. back-pressure)
+                await self._queue.put(_Message(writer, message.get('id', None),
+                                               message.get('session', None), events))
+        except ConnectionError:
+            pass
+        finally:
+            self._clients.discard(writer)
+            writer.close()
+
+    async def _run(self):
+        closing = False
+        while not closing:
+            message = await self._queue.get()
+            if message is None:
+                break
+            batch = [message]
+            count = len(message.events)
+            while (count < self._batch_size) and (not self._queue.empty()):
+                message = self._queue.get_nowait()
+                if message is None:
+                    closing = True
+                    break
+                batch.append(message)
+                count += len(message.events)
+            with _trace.span('ingest.batch', messages=len(batch), events=count):
+                try:
+                    acks  = self._apply(batch)
+                    error = await self._persist()
+                except Exception as e:
+                    # answers the batch, but keeps serving
+                    acks  = [{'id': message.id, 'ok': False, 'error': f"failed to apply: {e}"} \
+                             for message in batch]
+                    error = None
+            for message, ack in zip(batch, acks):
+                if (error is not None) and (ack['ok'] == True):
+                    ack = {'id': message.id, 'ok': False, 'error': f"failed to save: {error}"}
+                if not message.writer.is_closing():
+                    write_frame(message.writer, self._codec, ack)
+
+    def _apply(self, batch):
+        """inserts the events in `batch`, and returns the acknowledgements."""
+        acks    = []
+        targets = {} # id --> (entity, entries)
+        for message in batch:
+            try:
+                entity = None if message.target is None else self._resolve(_ids.as_id(message.target))
+                if not isinstance(entity, _core.Entity):
+                    raise ValueError(f"no such entity: {message.target}")
+                entries = [entity._entrycls(timestamp=parse_timestamp(event.get('timestamp', None)),
+                                            category=event.get('category', None),
+                                            description=event.get('description', None)) \
+                           for event in message.events]
+            except (ValueError, TypeError, AttributeError) as e:
+                acks.append({'id': message.id, 'ok': False, 'error': str(e)})
+                continue
+            targets.setdefault(id(entity), (entity, []))[1].extend(entries)
+            acks.append({'id': message.id, 'ok': True,
+                         'uuids': [_ids.format_id(entry.uuid) for entry in entries]})
+        for entity, entries in targets.values():
+            entity.extend(entries)
+        return acks
+
+    async def _persist(self):
+        """saves the journal (if any), and returns the error (or None)."""
+        journal = self._journal
+        if journal is None:
+            return None
+        if journal.needs_compaction():
+            kind, records = 'rewrite', journal.take_snapshot()
+        else:
+            kind, records = 'append', journal.take_pending()
+        if len(records) == 0:
+            return None
+        try:
+            await _asyncio.get_running_loop().run_in_executor(None, getattr(journal, kind), records)
+        except OSError as e:
+            if kind == 'append':
+                journal.requeue(records)
+            return e
+        return None
+
+class IngestClient:
+    """a client of IngestServer (e.g. a stand-in for an acquisition rig)."""
+    def __init__(self, codec='json'):
+        self._codec   = get_codec(codec)
+        self._reader  = None
+        self._writer  = None
+        self._task    = None
+        self._waiting = {} # id --> future
+        self._nextid  = 0
+
+    async def connect(self, path=None, host='127.0.0.1', port=None):
+        if path is not None:
+            self._reader, self._writer = await _asyncio.open_unix_connection(path=str(path))
+        else:
+            self._reader, self._writer = await _asyncio.open_connection(host=host, port=port)
+        self._task = _asyncio.get_running_loop().create_task(self._receive())
+        return self
+
+    async def _receive(self):
+        try:
+            while True:
+                ack = await read_frame(self._reader, self._codec)
+                if ack is None:
+                    break
+                future = self._waiting.pop(ack.get('id', None), None)
+                if (future is not None) and (not future.done()):
+                    future.set_result(ack)
+        except (ProtocolError, ConnectionError) as e:
+            error = e
+        else:
+            error = ConnectionError("connection closed by the server")
+        for future in self._waiting.values():
+            if not future.done():
+                future.set_exception(error)
+        self._waiting.clear()
+
+    async def post(self, session, events):
+        """sends `events` (a list of dicts) to the entity `session` (an
+        entity or its identifier), and returns the future of the acknowledgement."""
+        if isinstance(session, _core.Entity):
+            session = session.uuid
+        self._nextid += 1
+        message = {'id': self._nextid, 'session': _ids.format_id(_ids.as_id(session)),
+                   'events': [self._encode_event(event) for event in events]}
+        future  = _asyncio.get_running_loop().create_future()
+        self._waiting[message['id']] = future
+        write_frame(self._writer, self._codec, message)
+        await self._writer.drain()
+        return future
+
+    @staticmethod
+    def _encode_event(event):
+        timestamp = event.get('timestamp', None)
+        if isinstance(timestamp, _dt.datetime):
+            event = dict(event, timestamp=timestamp.isoformat())
+        return event
+
+    async def send(self, session, events):
+        """sends `events`, and waits for the acknowledgement."""
+        return await (await self.post(session, events))
+
+    async def log(self, session, description, category=None, timestamp=None):
+        return await self.send(session, [{'timestamp': timestamp, 'category': category,
+                                          'description': description}])
+
+    async def close(self):
+        if self._writer is None:
+            return
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except ConnectionError:
+            pass
+        await self._task
+        self._writer = None
@@ -37,6 +37,31 @@ def resolve(relative_path):
     relative_path = _Path(relative_path)
     return str(__root / relative_path)
 
+_contents = {} # relative path --> bytes
+_icons    = {} # relative path --> QIcon
+
+def read_bytes(relative_path):
+    """returns the content of the resource file as bytes.
+    the content is read only once per process."""
+    key = str(relative_path)
+    if key not in _contents.keys():
+        _contents[key] = (__root / key).read_bytes()
+    return _contents[key]
+
+def preload(pattern="*.png"):
+    """reads all the resource files that match `pattern` into memory."""
+    for path in __root.glob(pattern):
+        read_bytes(path.relative_to(__root).as_posix())
+
 def as_icon(relative_path):
-    """returns the data at the path as a QIcon."""
-    return _QtGui.QIcon(resolve(relative_path))
+    """returns the data at the path as a QIcon.
+    the icon is decoded only once per process."""
+    key = str(relative_path)
+    if key not in _icons.keys():
+        pixmap = _QtGui.QPixmap()
+        try:
+            pixmap.loadFromData(read_bytes(key))
+        except OSError:
+            _warn(f"failed to read the resource: {key}")
+        _icons[key] = _QtGui.QIcon(pixmap)
+    return _icons[key]
@@ -0,0 +1,127 @@
+#
+# MIT License
+#
+# Copyright (c) 2019 Keisuke Sehara
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+"""an incremental full-text index over an entity tree."""
+
+import re as _re
+from bisect import bisect_left as _bisect_left
+from collections import namedtuple as _namedtuple
+
+_word = _re.compile(r"\w+")
+
+def tokenize(text):
+    """returns the list of (case-folded) words in `text`."""
+    return _word.findall(str(text).casefold())
+
+class Hit(_namedtuple('Hit', ('entity', 'entry'))):
+    """a search result. `entry` is None when the title of `entity` matched."""
+    @property
+    def path(self):
+        return self.entity.as_title(parents=True)
+
+class SearchIndex:
+    """an inverted index of the words in the entries (descriptions and
+    categories) and in the entity titles of a tree.
+
+    the index keeps itself up to date by observing the root entity.
+    """
+    def __init__(self, root):
+        self._root     = root
+        self._postings = {}   # word --> {uuid: None} (as an ordered set)
+        self._words    = {}   # uuid --> the words being indexed
+        self._targets  = {}   # uuid --> Hit
+        self._vocab    = None # the sorted list of words (rebuilt when necessary)
+        self._add_entity(root)
+        root.add_observer(self._changed)
+
+    def close(self):
+        self._root.remove_observer(self._changed)
+
+    def _index(self, uuid, hit, words):
+        words = set(words)
+        for word in self._words.get(uuid, ()):
+            if word not in words:
+                posting = self._postings[word]
+                posting.pop(uuid, None)
+                if len(posting) == 0:
+                    del self._postings[word]
+                    self._vocab = None
+        for word in words:
+            if word not in self._postings.keys():
+                self._postings[word] = {}
+                self._vocab = None
+            self._postings[word][uuid] = None
+        self._words[uuid]   = words
+        self._targets[uuid] = hit
+
+    def _add_entry(self, entity, entry):
+        if entry.is_block():
+            if (entry.content is not None) and (entry.content.uuid not in self._targets.keys()):
+                self._add_entity(entry.content)
+        else:
+            self._index(entry.uuid, Hit(entity, entry),
+                        tokenize(entry.get_field('category')) + tokenize(entry.get_field('description')))
+
+    def _add_entity(self, entity):
+        self._index(entity.uuid, Hit(entity, None), tokenize(entity.get_title()))
+        for entry in entity.logs:
+            self._add_entry(entity, entry)
+
+    def _changed(self, event, source, *args):
+        if event == 'insert':
+            for entry in args[0]:
+                self._add_entry(source, entry)
+        elif event == 'set':
+            target = args[0]
+            if target is source:
+                self._index(source.uuid, Hit(source, None), tokenize(source.get_title()))
+            elif args[1] in ('category', 'description'):
+                self._add_entry(source, target)
+
+    def _matching(self, word, prefix=False):
+        if prefix == False:
+            return self._postings.get(word, {})
+        if self._vocab is None:
+            self._vocab = sorted(self._postings.keys())
+        matched = {}
+        pos     = _bisect_left(self._vocab, word)
+        while (pos < len(self._vocab)) and self._vocab[pos].startswith(word):
+            matched.update(self._postings[self._vocab[pos]])
+            pos += 1
+        return matched
+
+    def search(self, text, limit=None):
+        """returns the list of Hit objects that contain all the words in `text`.
+        the last word in `text` is matched as a prefix."""
+        words = tokenize(text)
+        if len(words) == 0:
+            return []
+        matches = [self._matching(word) for word in words[:-1]]
+        matches.append(self._matching(words[-1], prefix=True))
+        matches.sort(key=len)
+        common = matches[0].keys()
+        for other in matches[1:]:
+            common = common & other.keys()
+        hits = [self._targets[uuid] for uuid in matches[0] if uuid in common]
+        return hits if limit is None else hits[:limit]
@@ -0,0 +1,409 @@
+#
+# MIT License
+#
+# Copyright (c) 2019 Keisuke Sehara
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+"""append-only journal storage for Subject/Session trees.
+
+a journal file consists of JSON records, one per line. every insertion,
+field change and update in the tree is appended as a small record, and
+opening the file replays them into the entity objects.
+the file is rewritten as a snapshot of the current tree (i.e. 'compacted')
+once the number of records grows too large compared to the tree size.
+"""
+
+import os as _os
+import json as _json
+import datetime as _dt
+from pathlib import Path as _Path
+
+from . import core as _core
+from . import ids as _ids
+from . import trace as _trace
+from . import entities as _entities
+from . import columnar as _columnar
+
+FILE_SUFFIX = ".odlog"
+CHUNK_SIZE  = 1000
+
+_classes = {}
+
+def register_class(cls):
+    """makes `cls` (a subclass of Item or Entity) restorable from journals.
+
+    the constructor of the class must accept its fields and `uuid`
+    as keyword arguments."""
+    _classes[cls.__name__] = cls
+    return cls
+
+for _cls in (_core.Item, _core.Block, _entities.Subject, _entities.Session):
+    register_class(_cls)
+
+def encode_id(uuid):
+    return None if uuid is None else _ids.format_id(uuid)
+
+def decode_id(value):
+    return None if value is None else _ids.parse_id(value)
+
+def encode_value(value):
+    if isinstance(value, _dt.datetime):
+        return {'$time': value.isoformat()}
+    else:
+        return value
+
+def decode_value(value):
+    if isinstance(value, dict) and ('$time' in value.keys()):
+        return _dt.datetime.fromisoformat(value['$time'])
+    else:
+        return value
+
+def encode_entry(entry):
+    if entry.is_block():
+        content = entry.content
+        return {
+            'uuid':     encode_id(entry.uuid),
+            'category': entry.get_field('category'),
+            'block':    None if content is None else encode_id(content.uuid)
+        }
+    record = {
+        'uuid':   encode_id(entry.uuid),
+        'fields': dict((name, encode_value(entry.get_field(name))) for name in entry._fields)
+    }
+    if entry.__class__ not in (_core.Item, _columnar.EntryView):
+        record['class'] = entry.__class__.__name__
+    return record
+
+def encode_entity(entity, parent=None):
+    fields = dict((name, encode_value(entity.get_field(name))) \
+                    for name in entity._fields if name != entity._parentname)
+    return {
+        'op':     'entity',
+        'class':  entity.__class__.__name__,
+        'uuid':   encode_id(entity.uuid),
+        'parent': None if parent is None else encode_id(parent.uuid),
+        'fields': fields
+    }
+
+def snapshot(entity, parent=None):
+    """generates the records that reproduce `entity` and its descendants."""
+    yield encode_entity(entity, parent=parent)
+    owner = encode_id(entity.uuid)
+    chunk = []
+    for entry in entity.logs:
+        if entry.is_block() and (entry.content is not None):
+            # the content must be restored before its block
+            if len(chunk) > 0:
+                yield {'op': 'insert', 'owner': owner, 'index': None, 'entries': chunk}
+                chunk = []
+            yield from snapshot(entry.content, parent=entity)
+        chunk.append(encode_entry(entry))
+        if len(chunk) >= CHUNK_SIZE:
+            yield {'op': 'insert', 'owner': owner, 'index': None, 'entries': chunk}
+            chunk = []
+    if len(chunk) > 0:
+        yield {'op': 'insert', 'owner': owner, 'index': None, 'entries': chunk}
+
+class Replay:
+    """restores the entity tree from a sequence of journal records."""
+    def __init__(self):
+        self.root     = None
+        self.objects  = {}
+        self.modified = {}
+        self.records  = 0
+
+    def apply(self, record):
+        op = record['op']
+        if op == 'entity':
+            self._restore_entity(record)
+        elif op == 'insert':
+            self._restore_entries(record)
+        elif op == 'set':
+            target = self.objects[decode_id(record['target'])]
+            target.set_field(record['name'], decode_value(record['value']))
+        elif op == 'update':
+            self.modified[decode_id(record['target'])] = decode_value(record['modified'])
+        else:
+            raise ValueError(f"unknown journal record: {op}")
+        self.records += 1
+
+    def _restore_entity(self, record):
+        cls    = _classes[record['class']]
+        parent = None if record['parent'] is None else self.objects[decode_id(record['parent'])]
+        fields = dict((name, decode_value(value)) for name, value in record['fields'].items())
+        if cls._parentname is not None:
+            fields[cls._parentname] = parent
+        entity = cls(uuid=decode_id(record['uuid']), **fields)
+        if (parent is not None) and (entity._parent is None):
+            entity._parent = parent
+        if self.root is None:
+            self.root = entity
+        self.objects[entity.uuid]  = entity
+        self.modified[entity.uuid] = entity._modified
+
+    def _restore_entries(self, record):
+        owner   = self.objects[decode_id(record['owner'])]
+        index   = record['index']
+        entries = []
+        for item in record['entries']:
+            if 'block' in item.keys():
+                content = None if item['block'] is None else self.objects[decode_id(item['block'])]
+                entry = _core.Block(category=item['category'], content=content,
+                                    uuid=decode_id(item['uuid']))
+            else:
+                cls    = _classes[item.get('class', 'Item')]
+                fields = dict((name, decode_value(value)) for name, value in item['fields'].items())
+                entry  = cls(uuid=decode_id(item['uuid']), **fields)
+            entries.append(entry)
+        entries = owner.place_many(entries, index=(-1 if index is None else index))
+        for entry in entries:
+            self.objects[entry.uuid] = entry
+
+    def finish(self):
+        """restores the modification timestamps, and returns the root entity."""
+        for uuid, modified in self.modified.items():
+            self.objects[uuid]._modified = modified
+        return self.root
+
+class Journal:
+    """an append-only journal that keeps track of changes in an entity tree.
+
+    changes are kept as pending records until `commit()` is called,
+    so that saving costs in proportion to the number of changes.
+    """
+    compact_ratio = 2.0
+    compact_min   = 1000
+
+    def __init__(self, path, root):
+        self._path    = _Path(path)
+        self._root    = root
+        self._pending = []
+        self._updates = {}
+        self._known   = set()
+        self._written = 0 # the number of records since the last compaction
+        self._live    = 0 # the number of objects at the last compaction
+        self._snapshot_lost = False
+        self._signature     = None
+        root.add_observer(self._record)
+
+    @classmethod
+    def create(cls, path, root):
+        """writes `root` as a new journal file at `path`."""
+        journal = cls(path, root)
+        journal.compact()
+        return journal
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def root(self):
+        return self._root
+
+    @property
+    def signature(self):
+        """the signature of the file as of the last load or write by this journal."""
+        return self._signature
+
+    def has_changes(self):
+        return (len(self._pending) > 0) or (len(self._updates) > 0)
+
+    def close(self):
+        self._root.remove_observer(self._record)
+
+    def _snapshot(self, entity, parent=None):
+        for record in snapshot(entity, parent=parent):
+            if record['op'] == 'entity':
+                self._known.add(record['uuid'])
+            yield record
+
+    def _record(self, event, source, *args):
+        owner = encode_id(source.uuid)
+        if owner not in self._known:
+            # will be recorded as a part of the snapshot of its block
+            return
+        if event == 'insert':
+            entries, index = args
+            for entry in entries:
+                if entry.is_block() and (entry.content is not None) \
+                    and (encode_id(entry.content.uuid) not in self._known):
+                    self._pending.extend(self._snapshot(entry.content, parent=source))
+            self._pending.append({
+                'op':      'insert',
+                'owner':   owner,
+                'index':   index,
+                'entries': [encode_entry(entry) for entry in entries]
+            })
+        elif event == 'set':
+            target, name, value = args
+            if (target is source) and (name == 'modified'):
+                self._updates[owner] = encode_value(value)
+            else:
+                self._pending.append({
+                    'op':     'set',
+                    'owner':  owner,
+                    'target': encode_id(target.uuid),
+                    'name':   name,
+                    'value':  encode_value(value)
+                })
+        elif event == 'update':
+            self._updates[owner] = encode_value(args[0])
+
+    def take_pending(self):
+        """returns the pending records, and clears them from the journal."""
+        records = self._pending
+        records.extend({'op': 'update', 'target': uuid, 'modified': modified} \
+                        for uuid, modified in self._updates.items())
+        self._pending = []
+        self._updates = {}
+        return records
+
+    def requeue(self, records):
+        """puts back the records taken by `take_pending()` (e.g. after a failed write)."""
+        self._pending[:0] = records
+
+    def take_snapshot(self):
+        """returns the records that reproduce the current tree, and
+        clears the pending records. the records have to be written
+        by `rewrite()`, otherwise the next save has to be a snapshot again."""
+        self._pending  = []
+        self._updates  = {}
+        self._known.clear()
+        self._snapshot_lost = True
+        return list(self._snapshot(self._root))
+
+    def needs_compaction(self):
+        return self._snapshot_lost \
+            or (self._written > max(self.compact_min, self.compact_ratio * self._live))
+
+    def append(self, records):
+        """appends `records` to the journal file.
+        this method does not touch the entity tree, and can be called from another thread."""
+        if len(records) == 0:
+            return
+        with open(self._path, 'a', encoding='utf-8') as out:
+            for record in records:
+                out.write(_json.dumps(record, separators=(',', ':')) + '\n')
+            out.flush()
+            _os.fsync(out.fileno())
+        self._written  += len(records)
+        self._signature = signature(self._path)
+
+    def rewrite(self, records):
+        """replaces the journal file with `records` (taken by `take_snapshot()`).
+        this method does not touch the entity tree, and can be called from another thread."""
+        tmp  = self._path.with_name(self._path.name + '.tmp')
+        live = 0
+        with open(tmp, 'w', encoding='utf-8') as out:
+            for record in records:
+                out.write(_json.dumps(record, separators=(',', ':')) + '\n')
+                live += len(record.get('entries', ())) + (1 if record['op'] == 'entity' else 0)
+            out.flush()
+            _os.fsync(out.fileno())
+        _os.replace(tmp, self._path)
+        self._written       = len(records)
+        self._live          = live
+        self._snapshot_lost = False
+        self._signature     = signature(self._path)
+
+    def commit(self):
+        """appends the pending records to the journal file."""
+        if self.needs_compaction():
+            self.compact()
+            return
+        with _trace.span('journal.commit', path=str(self._path)) as span:
+            records = self.take_pending()
+            span.set(records=len(records))
+            try:
+                self.append(records)
+            except OSError:
+                self.requeue(records)
+                raise
+        if self.needs_compaction():
+            self.compact()
+
+    def compact(self):
+        """rewrites the journal file as a snapshot of the current tree."""
+        with _trace.span('journal.compact', path=str(self._path)):
+            self.rewrite(self.take_snapshot())
+
+def signature(path):
+    """returns the (size, mtime) signature of the file, to tell whether it has changed."""
+    stat = _os.stat(path)
+    return (stat.st_size, stat.st_mtime_ns)
+
+def read(path):
+    """replays the journal file at `path`. returns the Replay object,
+    and the line number of the incomplete record at the end (or None)."""
+    replay    = Replay()
+    truncated = None
+    with open(path, 'r', encoding='utf-8') as src:
+        for lineno, line in enumerate(src, start=1):
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            if truncated is not None:
+                raise ValueError(f"{path}: broken record at line {truncated}")
+            try:
+                record = _json.loads(line)
+            except ValueError:
+                # possibly an interrupted write at the end of the file
+                truncated = lineno
+                continue
+            replay.apply(record)
+    if replay.root is None:
+        raise ValueError(f"{path}: no entity found in the journal")
+    return replay, truncated
+
+def _walk(entity):
+    yield entity
+    for child in entity.children:
+        yield from _walk(child)
+
+def restore(path, root, written, truncated=None, sig=None, live=None):
+    """returns the Journal object for the file at `path`, given
+    the `root` restored from it.
+
+    `written` is the number of records in the file, `sig` is the signature
+    of the file when it was read, and `live` is the number of the objects
+    in the tree (if known)."""
+    journal = Journal(path, root)
+    journal._known     = set(encode_id(entity.uuid) for entity in _walk(root))
+    journal._written   = written
+    journal._live      = len(journal._known) if live is None else live
+    journal._signature = sig
+    if truncated is not None:
+        journal.compact()
+    return journal
+
+def load(path):
+    """replays the journal file at `path`, and returns the Journal object
+    that keeps track of the restored tree (available as `journal.root`)."""
+    with _trace.span('journal.load', path=str(path)):
+        sig               = signature(path)
+        replay, truncated = read(path)
+        return restore(path, replay.finish(), replay.records, truncated=truncated,
+                       sig=sig, live=len(replay.objects))
+
+def save(root, path):
+    """writes `root` to a new journal file, and returns the Journal object."""
+    return Journal.create(path, root)
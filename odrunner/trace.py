@@ -0,0 +1,215 @@
+#
+# MIT License
+#
+# Copyright (c) 2019 Keisuke Sehara
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+"""low-overhead instrumentation: structured events, counters and timing spans.
+
+tracing is off by default (or on if the ODRUNNER_TRACE environment variable is
+set to a non-empty value other than '0'). when it is off, `event()` and `span()`
+return immediately, and hot paths are expected to guard their calls as in:
+
+    if _trace.ENABLED:
+        _trace.count('model.data')
+
+records are dicts with at least the 'time' (seconds since the epoch) and 'event'
+keys, and are passed to each of the registered sinks (any callable accepting a
+record, e.g. StderrSink, FileSink or RingBuffer).
+"""
+
+import os as _os
+import sys as _sys
+import time as _time
+import threading as _threading
+from collections import deque as _deque
+
+ENABLED = _os.environ.get('ODRUNNER_TRACE', '') not in ('', '0')
+
+_sinks    = []
+_counters = {}
+_lock     = _threading.Lock()
+
+def _format(record):
+    import json as _json # not imported unless tracing is used
+    return _json.dumps(record, default=str, ensure_ascii=False)
+
+class StderrSink:
+    """writes records to the standard error (or `stream`), one JSON object per line."""
+    def __init__(self, stream=None):
+        self._stream = stream
+
+    def __call__(self, record):
+        stream = _sys.stderr if self._stream is None else self._stream
+        print(_format(record), file=stream, flush=True)
+
+class FileSink:
+    """writes records to a file as JSON lines, rotating it once it
+    grows beyond `max_bytes` (keeping `backups` older files)."""
+    def __init__(self, path, max_bytes=10_000_000, backups=3):
+        # (logging.handlers imports socket etc., which costs at start-up)
+        import logging as _logging
+        from logging.handlers import RotatingFileHandler as _RotatingFileHandler
+        self._handler = _RotatingFileHandler(str(path), maxBytes=max_bytes,
+                                             backupCount=backups, encoding='utf-8')
+        self._handler.setFormatter(_logging.Formatter('%(message)s'))
+
+    def __call__(self, record):
+        import logging as _logging
+        self._handler.emit(_logging.makeLogRecord({'msg': _format(record),
+                                                   'levelno': _logging.INFO,
+                                                   'levelname': 'INFO'}))
+
+    def close(self):
+        self._handler.close()
+
+class RingBuffer:
+    """keeps the last `capacity` records in memory."""
+    def __init__(self, capacity=10000):
+        self._records = _deque(maxlen=capacity)
+
+    def __call__(self, record):
+        self._records.append(record)
+
+    def __len__(self):
+        return len(self._records)
+
+    def records(self, event=None):
+        """returns the list of the records (of the `event` type, if specified)."""
+        records = list(self._records)
+        if event is not None:
+            records = [record for record in records if record['event'] == event]
+        return records
+
+    def clear(self):
+        self._records.clear()
+
+def add_sink(sink):
+    with _lock:
+        if sink not in _sinks:
+            _sinks.append(sink)
+    return sink
+
+def remove_sink(sink):
+    with _lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+    if hasattr(sink, 'close'):
+        sink.close()
+
+def enable(*sinks):
+    """turns on tracing, registering `sinks` in addition to the current ones."""
+    global ENABLED
+    for sink in sinks:
+        add_sink(sink)
+    ENABLED = True
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+def emit(record):
+    for sink in tuple(_sinks):
+        try:
+            sink(record)
+        except Exception as e:
+            print(f"trace sink {sink!r} failed: {e}", file=_sys.stderr)
+
+def event(name, **fields):
+    """emits a structured record of the `name` event."""
+    if not ENABLED:
+        return
+    record = {'time': _time.time(), 'event': name}
+    record.update(fields)
+    emit(record)
+
+def count(name, value=1):
+    """increments the counter `name` by `value`."""
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+def counters(reset=False):
+    """returns a copy of the counters (optionally resetting them)."""
+    global _counters
+    with _lock:
+        current = dict(_counters)
+        if reset == True:
+            _counters = {}
+    return current
+
+def reset():
+    counters(reset=True)
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **fields):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+class Span:
+    """times the enclosed block, and emits the `name` event with its
+    'duration' (in seconds) on exit. the time is also accumulated in the
+    '<name>.seconds' counter, next to the '<name>' call counter."""
+    __slots__ = ('name', 'fields', '_start')
+
+    def __init__(self, name, fields):
+        self.name   = name
+        self.fields = fields
+        self._start = None
+
+    def set(self, **fields):
+        """adds fields to the record to be emitted."""
+        self.fields.update(fields)
+
+    def __enter__(self):
+        self._start = _time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = _time.perf_counter() - self._start
+        with _lock:
+            _counters[self.name] = _counters.get(self.name, 0) + 1
+            key = self.name + '.seconds'
+            _counters[key] = _counters.get(key, 0.0) + duration
+        if exc_type is not None:
+            self.fields['error'] = exc_type.__name__
+        event(self.name, duration=duration, **self.fields)
+        return False
+
+def span(name, **fields):
+    """returns a context manager that times the enclosed block (a shared
+    no-op object when tracing is disabled)."""
+    if not ENABLED:
+        return _NULL_SPAN
+    return Span(name, fields)
+
+if ENABLED:
+    add_sink(StderrSink())
@@ -25,29 +25,77 @@ from qtpy import QtCore as _QtCore
 from qtpy.QtCore import Qt as _Qt
 from qtpy import QtWidgets as _QtWidgets
 from qtpy import QtGui as _QtGui
+import sqlite3 as _sqlite3
+from collections import OrderedDict as _OrderedDict
+from bisect import bisect_left as _bisect_left, bisect_right as _bisect_right
 
 from .core import debug as _debug
+from . import trace as _trace
+from .core import Item as _Item
+from .core import format_times as _format_times
+from .core import parse_date as _parse_date
+from .columnar import EntryView as _EntryView
+from .columnar import StringTable as _StringTable
+from .columnar import to_epoch as _to_epoch
+from .entities import Subject as _Subject
 from .resources import as_icon as _get_icon
+from . import storage as _storage
+from .search import SearchIndex as _SearchIndex
+from .autosave import AutoSaver as _AutoSaver
+from .catalog import Catalog as _Catalog
 
 class TableView(_QtWidgets.QTableView):
-    def __init__(self, data, logger=None, parent=None):
+    """the table view of the log entries of an entity.
+
+    double-clicking a block calls `opener(entity)` with its content
+    (or opens it in a window, if `opener` is None).
+    clicking a column header sorts the rows through a LogSortFilterModel
+    (clicking the same header cycles through ascending, descending and
+    the insertion order).
+    """
+    def __init__(self, data, logger=None, parent=None, opener=None):
         super().__init__(parent=parent)
         self.data    = data
+        self._opener = opener
         self._logger = LogDataModel(data) if logger is None else logger
-        self.setModel(self._logger)
+        self._proxy  = LogSortFilterModel(self._logger, parent=self)
+        self.setModel(self._proxy)
         self._logger.checkedError.connect(self.showErrorDialog)
         self.setSelectionBehavior(_QtWidgets.QAbstractItemView.SelectRows)
-        self.horizontalHeader().setStretchLastSection(True)
+        header = self.horizontalHeader()
+        header.setStretchLastSection(True)
+        header.setSortIndicator(-1, _Qt.AscendingOrder) # insertion order
+        header.setSortIndicatorShown(True)
+        header.sectionClicked.connect(self._headerClicked)
         self.doubleClicked.connect(self.openEntry)
 
+    def proxy(self):
+        return self._proxy
+
+    def _headerClicked(self, column):
+        # the sort indicator has already been updated by the header
+        if (self._proxy.sortColumn() == column) \
+                and (self._proxy.sortOrder() == _Qt.DescendingOrder):
+            column = -1
+            self.horizontalHeader().setSortIndicator(-1, _Qt.AscendingOrder)
+        self._proxy.sort(column, self.horizontalHeader().sortIndicatorOrder())
+
+    def setCategoryFilter(self, category=None):
+        """shows only the entries of `category` (or all the entries, if None)."""
+        self._proxy.setCategoryFilter(category)
+
     def insert(self, entry, index=-1):
         self._logger.insert(entry, index)
 
     def openEntry(self, index):
-        entry = self._logger.getEntryAt(index)
+        entry = self._logger.getEntryAt(self._proxy.mapToSource(index))
         if (entry is not None) and entry.is_block():
-            _debug(f"opening: {entry}")
-            openEntity(entry.content, as_window=True)
+            if _trace.ENABLED:
+                _trace.event('ui.open', entry=str(entry))
+            if self._opener is None:
+                openEntity(entry.content, as_window=True)
+            else:
+                self._opener(entry.content)
         # TODO: ignore all the primitive entries?
 
     def showErrorDialog(self, title, msg):
@@ -55,14 +103,45 @@ class TableView(_QtWidgets.QTableView):
 
 
 class LogDataModel(_QtCore.QAbstractTableModel):
-    """the table model for logging of procedures to subjects."""
+    """the table model for logging of procedures to subjects.
+
+    by default, the rows are exposed page by page (`page_size` rows at a time)
+    as the view requests them through `canFetchMore`/`fetchMore`.
+    set `page_size` to None to expose all the entries at once.
+
+    the display strings are cached per entry and column, and are invalidated
+    only when the corresponding entry (or the child entity of a block) changes.
+    changes made inside `Entity.batch()` are reflected at once when the batch ends.
+    call `release()` to detach the model from the entity when it is no longer used.
+    """
     checkedError = _QtCore.Signal(str, str)
+    DEFAULT_PAGE_SIZE = 500
+    SortKeyRole       = _Qt.UserRole + 1 # the typed key for sorting (see sortKey())
 
-    def __init__(self, data, parent=None):
+    def __init__(self, data, parent=None, page_size=DEFAULT_PAGE_SIZE):
         super().__init__(parent=parent)
-        self._entrycls = data._entrycls
-        self._data     = data
-        self._root     = _QtCore.QModelIndex()
+        self._entrycls  = data._entrycls
+        self._data      = data
+        self._root      = _QtCore.QModelIndex()
+        self._page_size = page_size
+        self._loaded    = len(data) if page_size is None else min(len(data), page_size)
+        self._size      = len(data) # the number of entries known to the model
+        self._cache     = {} # entry uuid --> list of display strings
+        self._rowhint   = None
+        self._rows      = None # entry uuid --> row (of the loaded ones); None when it has to be rebuilt
+        self._inserting = False
+        self._categories = _StringTable() # the codes of the category names
+        self._data.add_observer(self._entityChanged)
+        self._prefetch(0, self._loaded)
+
+    def release(self):
+        """detaches this model from the entity, and clears its display cache."""
+        self._data.remove_observer(self._entityChanged)
+        self._cache.clear()
+
+    def clearCache(self):
+        """drops the display strings (e.g. while no view shows this model)."""
+        self._cache.clear()
 
     def headerData(self, section, orientation, role):
         """overrides QAbstractTableModel::headerData."""
@@ -78,10 +157,50 @@ class LogDataModel(_QtCore.QAbstractTableModel):
         """overrides QAbstractTableModel::rowCount."""
         if not parent.isValid():
             # root
-            return len(self._data)
+            return self._loaded
         else:
             return 0
 
+    def canFetchMore(self, parent):
+        """overrides QAbstractTableModel::canFetchMore."""
+        if not parent.isValid():
+            return self._loaded < len(self._data)
+        else:
+            return False
+
+    def fetchMore(self, parent):
+        """overrides QAbstractTableModel::fetchMore."""
+        if parent.isValid():
+            return
+        count = len(self._data) - self._loaded
+        if self._page_size is not None:
+            count = min(count, self._page_size)
+        if count <= 0:
+            return
+        with _trace.span('model.fetch', rows=count):
+            self._prefetch(self._loaded, self._loaded + count)
+            self.beginInsertRows(self._root, self._loaded, self._loaded + count - 1)
+            self._rowsLoaded(self._loaded, count)
+            self._loaded += count
+            self.endInsertRows()
+
+    def _prefetch(self, start, stop):
+        """formats the timestamps of the rows in [start, stop) in one call."""
+        if 'timestamp' not in self._entrycls._fields:
+            return
+        column  = self._entrycls._fields.index('timestamp')
+        entries = []
+        for row in range(start, stop):
+            entry = self._data.get_entry(row)
+            if (entry.__class__.as_str in (_Item.as_str, _EntryView.as_str)) \
+                and (not entry.is_block()) and (entry.uuid not in self._cache.keys()):
+                entries.append(entry)
+        texts = _format_times(entry.get_field('timestamp') for entry in entries)
+        for entry, text in zip(entries, texts):
+            cached = [None] * len(self._entrycls._fields)
+            cached[column] = text
+            self._cache[entry.uuid] = cached
+
     def columnCount(self, parent):
         """overrides QAbstractTableModel::columnCount."""
         if not parent.isValid():
@@ -98,22 +217,146 @@ class LogDataModel(_QtCore.QAbstractTableModel):
         return base
 
     def data(self, index, role):
+        if _trace.ENABLED:
+            _trace.count('model.data')
         if index.isValid():
             if role in (_Qt.DisplayRole, _Qt.EditRole):
-                return self._data.get_entry(index.row()).for_display(index.column())
+                return self.displayString(index.row(), index.column())
+            elif role == self.SortKeyRole:
+                return self.sortKey(index.row(), index.column())
             else:
                 return None
         else:
             return None
 
+    def sortKey(self, row, column):
+        return self.sortKeys(column, row, row + 1)[0]
+
+    def sortKeys(self, column, start, stop):
+        """returns the sort keys of the rows in [start, stop) in `column`:
+        epoch microseconds for times, the category codes (see categoryCode()),
+        or the strings for the other fields."""
+        name    = self.columnName(column)
+        entries = [self._data.get_entry(row) for row in range(start, stop)]
+        if name in ('timestamp', 'start', 'end'):
+            return [_to_epoch(entry.get_field(name)) for entry in entries]
+        elif name == 'category':
+            code = self._categories.code
+            return [code(entry.get_field(name)) for entry in entries]
+        else:
+            return [entry.as_str(name) for entry in entries]
+
+    def categoryCode(self, category):
+        """returns the code of `category` used in the sort keys."""
+        return self._categories.code(category)
+
+    def categoryName(self, code):
+        return self._categories.get(code)
+
+    def categoryCount(self):
+        return len(self._categories)
+
+    def displayString(self, row, column):
+        entry  = self._data.get_entry(row)
+        cached = self._cache.get(entry.uuid, None)
+        if cached is None:
+            cached = [None] * len(self._entrycls._fields)
+            self._cache[entry.uuid] = cached
+        value = cached[column]
+        if value is None:
+            if _trace.ENABLED:
+                _trace.count('model.cache_miss')
+            value = entry.for_display(column)
+            cached[column] = value
+        return value
+
     def setData(self, index, value, role):
         entry = self._data.get_entry(index.row())
         try:
+            self._rowhint = index.row()
             entry.set_field(self._entrycls._fields[index.column()], value)
             return True
         except ValueError as e:
             self.checkedError.emit("Input error", str(e))
             return False
+        finally:
+            self._rowhint = None
+
+    def _rowsLoaded(self, index, count):
+        """updates the row map before `count` rows at `index` are added to the loaded ones."""
+        if self._rows is None:
+            return
+        elif index == self._loaded:
+            for row in range(index, index + count):
+                self._rows[self._data.get_entry(row).uuid] = row
+        else:
+            # the following rows have been shifted
+            self._rows = None
+
+    def _findRow(self, uuid):
+        """returns the row of the (loaded) entry having `uuid`, or None."""
+        if (self._rowhint is not None) and (self._rowhint < self._loaded) \
+            and (self._data.get_entry(self._rowhint).uuid == uuid):
+            return self._rowhint
+        if self._rows is None:
+            self._rows = dict((self._data.get_entry(row).uuid, row) for row in range(self._loaded))
+        return self._rows.get(uuid, None)
+
+    def _invalidate(self, uuid):
+        row = self._findRow(uuid)
+        if row is not None:
+            self._cache.pop(uuid, None)
+            self.dataChanged.emit(self.index(row, 0),
+                                  self.index(row, len(self._entrycls._fields) - 1))
+
+    def _rowsInserted(self, index, count):
+        """reflects the entries that have been inserted without using this model."""
+        self._size += count
+        if index > self._loaded:
+            # the rows are yet to be fetched
+            return
+        self.beginInsertRows(self._root, index, index + count - 1)
+        self._rowsLoaded(index, count)
+        self._loaded += count
+        self.endInsertRows()
+
+    def _batchEnded(self):
+        if len(self._data) != self._size:
+            self.beginResetModel()
+            self._cache.clear()
+            self._rows = None
+            self._size = len(self._data)
+            if self._page_size is None:
+                self._loaded = self._size
+            else:
+                self._loaded = min(self._size, max(self._loaded, self._page_size))
+            self.endResetModel()
+        elif self._loaded > 0:
+            self._cache.clear()
+            self.dataChanged.emit(self.index(0, 0),
+                                  self.index(self._loaded - 1, len(self._entrycls._fields) - 1))
+
+    def _entityChanged(self, event, source, *args):
+        if event == 'batch':
+            if source is self._data:
+                self._batchEnded()
+            return
+        elif self._data.in_batch():
+            # to be coalesced when the batch ends
+            return
+        if source is self._data:
+            if (event == 'insert') and (self._inserting == False):
+                self._rowsInserted(args[1], len(args[0]))
+            elif event == 'set':
+                target = args[0]
+                if (target is not source) and (target.uuid in self._cache.keys()):
+                    self._invalidate(target.uuid)
+        elif (source.get_parent() is self._data) and (event == 'update'):
+            # the block representing the child entity
+            # (any change in the child ends up with its update)
+            block = self._data.get_block(source)
+            if (block is not None) and (block.uuid in self._cache.keys()):
+                self._invalidate(block.uuid)
 
     def getEntryAt(self, index):
         if index.isValid():
@@ -127,19 +370,424 @@ class LogDataModel(_QtCore.QAbstractTableModel):
         index = int(index)
         if index < 0:
             index = len(self._data) + 1 + index
-        self.beginInsertRows(self._root, index, index)
-        self._data.insert(entry, index=index)
+        self._inserting = True
+        try:
+            if index > self._loaded:
+                # the row is yet to be fetched
+                self._data.insert(entry, index=index)
+                self._size += 1
+                return
+            self.beginInsertRows(self._root, index, index)
+            self._data.insert(entry, index=index)
+            self._rowsLoaded(index, 1)
+            self._size   += 1
+            self._loaded += 1
+            self.endInsertRows()
+        finally:
+            self._inserting = False
+
+    def insertMany(self, entries, index=-1):
+        """inserts `entries` at once, with a single notification of the inserted rows."""
+        entries = list(entries)
+        for entry in entries:
+            if not isinstance(entry, self._entrycls):
+                raise ValueError(f"expected {self._entrycls.__name__}, got {entry.__class__.__name__}")
+        if len(entries) == 0:
+            return
+        index = int(index)
+        if index < 0:
+            index = len(self._data) + 1 + index
+        self._inserting = True
+        try:
+            if index > self._loaded:
+                # the rows are yet to be fetched
+                self._data.extend(entries, index=index)
+                self._size += len(entries)
+                return
+            self.beginInsertRows(self._root, index, index + len(entries) - 1)
+            self._data.extend(entries, index=index)
+            self._rowsLoaded(index, len(entries))
+            self._size   += len(entries)
+            self._loaded += len(entries)
+            self.endInsertRows()
+        finally:
+            self._inserting = False
+
+class LogSortFilterModel(_QtCore.QAbstractProxyModel):
+    """sorts and/or filters (by category) the rows of a LogDataModel.
+
+    the sort keys (see LogDataModel.sortKeys()) are computed once per row and
+    column, and are kept up to date as the rows are inserted or edited, so that
+    sorting never calls data() for comparisons. the accepted source rows are kept
+    in the ascending order of the keys (the ties in the order of the rows).
+
+    while neither sorting nor filtering is in effect, the rows are fetched
+    page by page as in the source model; otherwise, all the rows are fetched.
+    """
+    REBUILD_THRESHOLD = 100 # the number of changed rows above which the model is reset
+
+    def __init__(self, source, parent=None):
+        super().__init__(parent=parent)
+        self._root     = _QtCore.QModelIndex()
+        self._column   = -1
+        self._order    = _Qt.AscendingOrder
+        self._category = None # the category code to be accepted (or None)
+        self._keys     = {}   # column --> the keys of the source rows
+        self._ranks    = None # category code --> rank in the order of the names
+        self._rows     = []   # the accepted source rows, in the ascending order
+        self._sorted   = []   # the keys of `_rows`
+        self._inverse  = None # source row --> index in `_rows` (built when necessary)
+        self._resetting = False
+        self.setSourceModel(source)
+
+    def setSourceModel(self, source):
+        previous = self.sourceModel()
+        if previous is not None:
+            previous.rowsInserted.disconnect(self._sourceRowsInserted)
+            previous.dataChanged.disconnect(self._sourceDataChanged)
+            previous.modelReset.disconnect(self._sourceReset)
+            previous.layoutChanged.disconnect(self._sourceReset)
+            previous.rowsRemoved.disconnect(self._sourceReset)
+        super().setSourceModel(source)
+        source.rowsInserted.connect(self._sourceRowsInserted)
+        source.dataChanged.connect(self._sourceDataChanged)
+        source.modelReset.connect(self._sourceReset)
+        source.layoutChanged.connect(self._sourceReset)
+        source.rowsRemoved.connect(self._sourceReset)
+        self._rebuild(clear=True)
+
+    def isActive(self):
+        """returns whether sorting or filtering is in effect."""
+        return (self._column >= 0) or (self._category is not None)
+
+    def sortColumn(self):
+        return self._column
+
+    def sortOrder(self):
+        return self._order
+
+    def sort(self, column, order=_Qt.AscendingOrder):
+        """sorts by `column` (or shows the rows in the source order, if `column` < 0)."""
+        self._column = column
+        self._order  = order
+        self._rebuild()
+
+    def setCategoryFilter(self, category=None):
+        source = self.sourceModel()
+        self._category = None if category is None else source.categoryCode(category)
+        self._rebuild()
+
+    def categoryFilter(self):
+        return None if self._category is None else self.sourceModel().categoryName(self._category)
+
+    def _categoryColumn(self):
+        return self.sourceModel()._entrycls._fields.index('category')
+
+    def _columnKeys(self, column):
+        keys = self._keys.get(column, None)
+        if keys is None:
+            keys = self.sourceModel().sortKeys(column, 0, self.sourceModel().rowCount(self._root))
+            self._keys[column] = keys
+        return keys
+
+    def _keyOf(self, row):
+        """returns the key of the source row in the current order (or None for an unknown category)."""
+        if self._column < 0:
+            return row
+        key = self._keys[self._column][row]
+        if self._ranks is not None:
+            return self._ranks.get(key, None)
+        return key
+
+    def _accepts(self, row):
+        return (self._category is None) or (self._keys[self._categoryColumn()][row] == self._category)
+
+    def _rebuild(self, clear=False):
+        source = self.sourceModel()
+        self._resetting = True
+        try:
+            self.beginResetModel()
+            if clear == True:
+                self._keys.clear()
+            if self.isActive():
+                while source.canFetchMore(self._root):
+                    source.fetchMore(self._root)
+            rows = range(source.rowCount(self._root))
+            if self._category is not None:
+                codes = self._columnKeys(self._categoryColumn())
+                rows  = [row for row in rows if codes[row] == self._category]
+            self._ranks = None
+            if self._column >= 0:
+                keys = self._columnKeys(self._column)
+                if source.columnName(self._column) == 'category':
+                    names = [source.categoryName(code) for code in range(source.categoryCount())]
+                    order = sorted(range(len(names)), key=names.__getitem__)
+                    self._ranks = dict((code, rank) for rank, code in enumerate(order))
+                    keys = [self._ranks[code] for code in keys]
+                self._rows   = sorted(rows, key=keys.__getitem__)
+                self._sorted = [keys[row] for row in self._rows]
+            else:
+                self._rows   = list(rows)
+                self._sorted = self._rows
+            self._inverse = None
+            self.endResetModel()
+        finally:
+            self._resetting = False
+
+    def _proxyRow(self, index):
+        """converts between the index in `_rows` and the row in this model."""
+        return index if self._order == _Qt.AscendingOrder else len(self._rows) - 1 - index
+
+    def _position(self, key, row):
+        lo = _bisect_left(self._sorted, key)
+        hi = _bisect_right(self._sorted, key, lo)
+        return _bisect_left(self._rows, row, lo, hi)
+
+    def _insertRow(self, row):
+        key = self._keyOf(row)
+        if key is None:
+            return False
+        index = self._position(key, row)
+        proxy = index if self._order == _Qt.AscendingOrder else len(self._rows) - index
+        self.beginInsertRows(self._root, proxy, proxy)
+        self._rows.insert(index, row)
+        if self._sorted is not self._rows:
+            self._sorted.insert(index, key)
+        self._inverse = None
         self.endInsertRows()
+        return True
 
-_views = []
+    def _removeRow(self, index):
+        proxy = self._proxyRow(index)
+        self.beginRemoveRows(self._root, proxy, proxy)
+        del self._rows[index]
+        if self._sorted is not self._rows:
+            del self._sorted[index]
+        self._inverse = None
+        self.endRemoveRows()
 
-def openEntity(entity, parent=None, as_window=True):
-    view = TableView(entity, parent=parent)
-    view.setWindowTitle(entity.as_title(parents=True))
-    if as_window == True:
+    def _sourceRowsInserted(self, parent, first, last):
+        if self._resetting == True:
+            return
+        count = last - first + 1
+        for column, keys in self._keys.items():
+            keys[first:first] = self.sourceModel().sortKeys(column, first, last + 1)
+        if not self.isActive():
+            self.beginInsertRows(self._root, first, last)
+            self._rows[first:first] = range(first, last + 1)
+            for index in range(last + 1, len(self._rows)):
+                self._rows[index] += count
+            self._sorted  = self._rows
+            self._inverse = None
+            self.endInsertRows()
+            return
+        if last < self.sourceModel().rowCount(self._root) - 1:
+            # the following rows have been shifted (in the same order)
+            self._rows = [row + count if row >= first else row for row in self._rows]
+            if self._column < 0:
+                self._sorted = self._rows
+            self._inverse = None
+        if count > self.REBUILD_THRESHOLD:
+            self._rebuild()
+        else:
+            for row in range(first, last + 1):
+                if self._accepts(row) and (self._insertRow(row) == False):
+                    # a new category
+                    self._rebuild()
+                    return
+
+    def _sourceDataChanged(self, topLeft, bottomRight, roles=()):
+        if self._resetting == True:
+            return
+        first, last = topLeft.row(), bottomRight.row()
+        for column, keys in self._keys.items():
+            keys[first:last + 1] = self.sourceModel().sortKeys(column, first, last + 1)
+        if not self.isActive():
+            self.dataChanged.emit(self.index(first, topLeft.column()),
+                                  self.index(last, bottomRight.column()), list(roles))
+            return
+        if last - first + 1 > self.REBUILD_THRESHOLD:
+            self._rebuild()
+            return
+        for row in range(first, last + 1):
+            index = self._indexOf(row)
+            if index >= 0:
+                key = self._keyOf(row)
+                if (not self._accepts(row)) or (key is None) or (self._sorted[index] != key):
+                    self._removeRow(index)
+                    index = -1
+            if index < 0:
+                if self._accepts(row) and (self._insertRow(row) == False):
+                    self._rebuild()
+                    return
+            proxy = self.mapFromSource(self.sourceModel().index(row, 0)).row()
+            if proxy >= 0:
+                self.dataChanged.emit(self.index(proxy, topLeft.column()),
+                                      self.index(proxy, bottomRight.column()), list(roles))
+
+    def _sourceReset(self, *args):
+        if self._resetting == False:
+            self._rebuild(clear=True)
+
+    def _indexOf(self, row):
+        if not self.isActive():
+            return row if row < len(self._rows) else -1
+        if self._inverse is None:
+            self._inverse = dict((source, index) for index, source in enumerate(self._rows))
+        return self._inverse.get(row, -1)
+
+    def mapToSource(self, index):
+        """overrides QAbstractProxyModel::mapToSource."""
+        if (not index.isValid()) or (index.row() >= len(self._rows)):
+            return _QtCore.QModelIndex()
+        return self.sourceModel().index(self._rows[self._proxyRow(index.row())], index.column())
+
+    def mapFromSource(self, index):
+        """overrides QAbstractProxyModel::mapFromSource."""
+        if not index.isValid():
+            return _QtCore.QModelIndex()
+        position = self._indexOf(index.row())
+        if position < 0:
+            return _QtCore.QModelIndex()
+        return self.createIndex(self._proxyRow(position), index.column())
+
+    def index(self, row, column, parent=_QtCore.QModelIndex()):
+        """overrides QAbstractItemModel::index."""
+        if parent.isValid() or (row < 0) or (row >= len(self._rows)) \
+                or (column < 0) or (column >= self.columnCount(self._root)):
+            return _QtCore.QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=None):
+        """overrides QAbstractItemModel::parent."""
+        if index is None:
+            return super().parent()
+        return _QtCore.QModelIndex()
+
+    def rowCount(self, parent=_QtCore.QModelIndex()):
+        """overrides QAbstractItemModel::rowCount."""
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=_QtCore.QModelIndex()):
+        """overrides QAbstractItemModel::columnCount."""
+        return 0 if parent.isValid() else self.sourceModel().columnCount(self._root)
+
+    def canFetchMore(self, parent):
+        """overrides QAbstractItemModel::canFetchMore."""
+        if parent.isValid() or self.isActive():
+            return False
+        return self.sourceModel().canFetchMore(self._root)
+
+    def fetchMore(self, parent):
+        """overrides QAbstractItemModel::fetchMore."""
+        if (not parent.isValid()) and (not self.isActive()):
+            self.sourceModel().fetchMore(self._root)
+
+    def headerData(self, section, orientation, role):
+        """overrides QAbstractProxyModel::headerData."""
+        return self.sourceModel().headerData(section, orientation, role)
+
+class ViewManager(_QtCore.QObject):
+    """keeps track of the views of the entities and their models.
+
+    an entity that is already open in a window is shown in the same window.
+    the views of an entity share a single model. once its last view is gone,
+    the display cache of the model is cleared, and up to `max_models` of
+    such unused models are kept (the least recently used ones are released
+    first), so that getting back to an entity does not rebuild its model.
+    """
+    DEFAULT_MAX_MODELS = 8
+
+    def __init__(self, max_models=DEFAULT_MAX_MODELS, parent=None):
+        super().__init__(parent=parent)
+        self.max_models = max_models
+        self._models    = _OrderedDict() # uuid --> LogDataModel (least recently used first)
+        self._users     = {} # uuid --> the number of the views using the model
+        self._windows   = {} # uuid --> TableView shown as a window
+
+    def modelCount(self):
+        return len(self._models)
+
+    def windows(self):
+        return list(self._windows.values())
+
+    def createView(self, entity, parent=None, opener=None):
+        """returns a new TableView of `entity`, sharing the model with the other views."""
+        key   = entity.uuid
+        model = self._models.get(key, None)
+        if model is None:
+            model = LogDataModel(entity)
+            self._models[key] = model
+        else:
+            self._models.move_to_end(key)
+        self._users[key] = self._users.get(key, 0) + 1
+        self._evict()
+        view = TableView(entity, logger=model, parent=parent, opener=opener)
+        view.destroyed.connect(lambda obj=None, key=key: self._viewDestroyed(key))
+        return view
+
+    def openWindow(self, entity, parent=None):
+        """shows `entity` in a window (the existing one, if any), and returns the view.
+        `parent` is used when a new view has to be created."""
+        key  = entity.uuid
+        view = self._windows.get(key, None)
+        if view is not None:
+            view.showNormal()
+            view.raise_()
+            view.activateWindow()
+            return view
+        view = self.createView(entity, parent=parent)
+        view.setAttribute(_Qt.WA_DeleteOnClose)
+        view.setWindowTitle(entity.as_title(parents=True))
+        view.destroyed.connect(lambda obj=None, key=key: self._windows.pop(key, None))
         view.resize(600, 400)
         view.show()
-        _views.append(view)
+        self._windows[key] = view
+        return view
+
+    def _viewDestroyed(self, key):
+        count = self._users.get(key, 0) - 1
+        if count > 0:
+            self._users[key] = count
+            return
+        self._users.pop(key, None)
+        model = self._models.get(key, None)
+        if model is not None:
+            model.clearCache()
+        self._evict()
+
+    def _evict(self):
+        excess = len(self._models) - self.max_models
+        for key in list(self._models.keys()):
+            if excess <= 0:
+                break
+            if self._users.get(key, 0) > 0:
+                continue
+            self._models.pop(key).release()
+            excess -= 1
+
+    def closeAll(self):
+        """closes all the windows, and releases the models that are no longer used."""
+        for view in list(self._windows.values()):
+            view.close()
+        for key in list(self._models.keys()):
+            if self._users.get(key, 0) == 0:
+                self._models.pop(key).release()
+
+_manager = None
+
+def viewManager():
+    """returns the ViewManager used by openEntity()."""
+    global _manager
+    if _manager is None:
+        _manager = ViewManager()
+    return _manager
+
+def openEntity(entity, parent=None, as_window=True):
+    if as_window == True:
+        return viewManager().openWindow(entity, parent=parent)
+    view = viewManager().createView(entity, parent=parent)
+    view.setWindowTitle(entity.as_title(parents=True))
     return view
 
 class Browser(_QtWidgets.QMainWindow):
@@ -147,16 +795,153 @@ class Browser(_QtWidgets.QMainWindow):
         super().__init__(parent=parent)
         self.__populateActions()
         self.resize(800, 600)
-        self.view_stack = []
+        self.view_stack = [] # the entities from the subject to the one shown (and further)
+        self.position   = -1 # the index of the entity being shown in `view_stack`
+        self.subject    = None
+        self.journal    = None
+        self.autosaver  = None
+        self.catalog    = None # opened upon the first use
+        self.index      = None # the SearchIndex, built upon the first search
+
+    def setSubject(self, subject, journal=None):
+        """shows `subject` in this browser. `journal` is the storage
+        where the changes in `subject` are to be saved."""
+        self._setJournal(None)
+        if self.index is not None:
+            self.index.close()
+        self.subject = subject
+        self.index   = None
+        self._setJournal(journal)
+        self.view_stack = [subject]
+        self.position   = 0
+        self._showCurrent()
+        self.actions['save'].setEnabled(True)
+        self.actions['search'].setEnabled(True)
+
+    def _showCurrent(self):
+        entity = self.view_stack[self.position]
+        self.setCentralWidget(viewManager().createView(entity, parent=self,
+                                                       opener=self._enterEntity))
+        self.setWindowTitle(entity.as_title(parents=True))
+        self.actions['prev'].setEnabled(self.position > 0)
+        self.actions['next'].setEnabled(self.position < len(self.view_stack) - 1)
+
+    def _enterEntity(self, entity):
+        """shows `entity` (a child of the current one) in place of the current view."""
+        following = self.position + 1
+        if (following >= len(self.view_stack)) or (self.view_stack[following] is not entity):
+            del self.view_stack[following:]
+            self.view_stack.append(entity)
+        self.position = following
+        self._showCurrent()
+
+    def _goBack(self, checked=None):
+        if self.position > 0:
+            self.position -= 1
+            self._showCurrent()
+
+    def _goForward(self, checked=None):
+        if self.position < len(self.view_stack) - 1:
+            self.position += 1
+            self._showCurrent()
+
+    def _setJournal(self, journal):
+        if self.autosaver is not None:
+            self.autosaver.close()
+            self.autosaver.deleteLater()
+            self.autosaver = None
+        if self.journal is not None:
+            self._updateCatalog(self.journal)
+            self.journal.close()
+        self.journal = journal
+        if journal is not None:
+            self._updateCatalog(journal)
+            self.autosaver = _AutoSaver(journal, parent=self)
+            self.autosaver.progress.connect(self.statusBar().showMessage)
+            self.autosaver.saved.connect(self._saved)
+            self.autosaver.failed.connect(self.showErrorDialog)
+
+    def _saved(self, path):
+        self.statusBar().showMessage(f"saved: {path}", 3000)
+        self._updateCatalog(self.journal)
+
+    def _getCatalog(self):
+        if self.catalog is None:
+            try:
+                self.catalog = _Catalog()
+            except (OSError, _sqlite3.Error) as e:
+                self.statusBar().showMessage(f"failed to open the catalog: {e}", 3000)
+        return self.catalog
+
+    def _updateCatalog(self, journal):
+        catalog = self._getCatalog()
+        if catalog is not None:
+            try:
+                catalog.update(journal.root, journal.path)
+            except _sqlite3.Error as e:
+                self.statusBar().showMessage(f"failed to update the catalog: {e}", 3000)
+
+    def showErrorDialog(self, title, msg):
+        _QtWidgets.QMessageBox.warning(self, title, msg)
+
+    def closeEvent(self, event):
+        self._setJournal(None)
+        super().closeEvent(event)
+
+    def _search(self, checked=None):
+        if self.subject is None:
+            return
+        text, ok = _QtWidgets.QInputDialog.getText(self, "Search", "Search for:")
+        if (ok == False) or (len(text.strip()) == 0):
+            return
+        if self.index is None:
+            self.index = _SearchIndex(self.subject)
+        hits = self.index.search(text)
+        if len(hits) == 0:
+            _QtWidgets.QMessageBox.information(self, "Search", f"no entries found for: {text}")
+            return
+        SearchResults(hits, parent=self).show()
 
     def _openSubject(self, checked=None):
-        _debug("open...")
+        catalog = self._getCatalog()
+        if (catalog is not None) and (len(catalog) > 0):
+            dialog = CatalogDialog(catalog, parent=self)
+            if dialog.exec_() != _QtWidgets.QDialog.Accepted:
+                return
+            path = dialog.selectedPath()
+        else:
+            path, _ = _QtWidgets.QFileDialog.getOpenFileName(self, "Open subject log",
+                                                            "", _file_filter)
+        if (path is None) or (len(path) == 0):
+            return
+        try:
+            journal = _storage.load(path)
+        except (OSError, ValueError, KeyError) as e:
+            _QtWidgets.QMessageBox.warning(self, "Failed to open", str(e))
+            return
+        self.setSubject(journal.root, journal)
 
     def _newSubject(self, checked=None):
-        _debug("new...")
+        ID, ok = _QtWidgets.QInputDialog.getText(self, "New subject", "Subject ID:")
+        if ok == True:
+            self.setSubject(_Subject(ID=ID))
 
     def _saveSubject(self, checked=None):
-        _debug("save...")
+        if self.subject is None:
+            return
+        try:
+            if self.journal is None:
+                path, _ = _QtWidgets.QFileDialog.getSaveFileName(self, "Save subject log",
+                                                                "", _file_filter)
+                if len(path) == 0:
+                    return
+                if not path.endswith(_storage.FILE_SUFFIX):
+                    path += _storage.FILE_SUFFIX
+                self._setJournal(_storage.save(self.subject, path))
+            else:
+                self.autosaver.saveNow()
+        except OSError as e:
+            _QtWidgets.QMessageBox.warning(self, "Failed to save", str(e))
 
     def _dummy(self, checked=None):
         _debug("dummy...")
@@ -210,6 +995,105 @@ class Browser(_QtWidgets.QMainWindow):
             else:
                 continue
 
+class SearchResults(_QtWidgets.QDialog):
+    """the dialog to list search hits. double-clicking a hit opens its entity."""
+    def __init__(self, hits, parent=None):
+        super().__init__(parent=parent)
+        self.setWindowTitle(f"Search results ({len(hits)})")
+        self._hits = hits
+        self._list = _QtWidgets.QListWidget(self)
+        for hit in hits:
+            if hit.entry is None:
+                self._list.addItem(hit.path)
+            else:
+                self._list.addItem(f"{hit.path} :: {hit.entry.for_display('description')}")
+        self._list.itemDoubleClicked.connect(self.openHit)
+        layout = _QtWidgets.QVBoxLayout(self)
+        layout.addWidget(self._list)
+        self.resize(500, 300)
+
+    def openHit(self, item):
+        openEntity(self._hits[self._list.row(item)].entity, as_window=True)
+
+class CatalogDialog(_QtWidgets.QDialog):
+    """the dialog to pick a subject log from the catalog."""
+    _columns = ('ID', 'name', 'species', 'strain', 'sessions', 'modified', 'path')
+
+    def __init__(self, catalog, parent=None):
+        super().__init__(parent=parent)
+        self.setWindowTitle("Open subject log")
+        self._catalog = catalog
+        self._records = []
+        self._path    = None
+        self._filters = {}
+        filters = _QtWidgets.QFormLayout()
+        for name, label in (('text', 'ID/name:'), ('species', 'Species:'), ('strain', 'Strain:')):
+            edit = _QtWidgets.QLineEdit(self)
+            edit.textChanged.connect(self.refresh)
+            filters.addRow(label, edit)
+            self._filters[name] = edit
+        self._dates = {}
+        for name, label in (('since', 'Sessions since:'), ('until', 'Sessions until:')):
+            edit = _QtWidgets.QLineEdit(self)
+            edit.setPlaceholderText("YYYY-MM-DD")
+            edit.textChanged.connect(self.refresh)
+            filters.addRow(label, edit)
+            self._dates[name] = edit
+        self._table = _QtWidgets.QTableWidget(0, len(self._columns), self)
+        self._table.setHorizontalHeaderLabels(self._columns)
+        self._table.setSelectionBehavior(_QtWidgets.QAbstractItemView.SelectRows)
+        self._table.setSelectionMode(_QtWidgets.QAbstractItemView.SingleSelection)
+        self._table.setEditTriggers(_QtWidgets.QAbstractItemView.NoEditTriggers)
+        self._table.horizontalHeader().setStretchLastSection(True)
+        self._table.doubleClicked.connect(self.accept)
+        buttons = _QtWidgets.QDialogButtonBox(_QtWidgets.QDialogButtonBox.Open
+                                              | _QtWidgets.QDialogButtonBox.Cancel, parent=self)
+        buttons.addButton("Browse...", _QtWidgets.QDialogButtonBox.ActionRole).clicked.connect(self.browse)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout = _QtWidgets.QVBoxLayout(self)
+        layout.addLayout(filters)
+        layout.addWidget(self._table)
+        layout.addWidget(buttons)
+        self.resize(700, 400)
+        self.refresh()
+
+    def refresh(self, text=None):
+        criteria = dict((name, edit.text().strip()) for name, edit in self._filters.items())
+        criteria = dict((name, value) for name, value in criteria.items() if len(value) > 0)
+        for name, edit in self._dates.items():
+            # (the dates that are incomplete or invalid are not used for filtering)
+            try:
+                criteria[name] = _parse_date(edit.text().strip())
+            except ValueError:
+                pass
+        self._records = self._catalog.find_subjects(**criteria)
+        self._table.setRowCount(len(self._records))
+        for row, record in enumerate(self._records):
+            for column, name in enumerate(self._columns):
+                value = getattr(record, name)
+                self._table.setItem(row, column,
+                                    _QtWidgets.QTableWidgetItem('' if value is None else str(value)))
+
+    def browse(self, checked=None):
+        path, _ = _QtWidgets.QFileDialog.getOpenFileName(self, "Open subject log",
+                                                        "", _file_filter)
+        if len(path) > 0:
+            self._path = path
+            super().accept()
+
+    def accept(self, index=None):
+        rows = self._table.selectionModel().selectedRows()
+        if len(rows) == 0:
+            return
+        self._path = self._records[rows[0].row()].path
+        super().accept()
+
+    def selectedPath(self):
+        return self._path
+
+_file_filter = f"Subject log (*{_storage.FILE_SUFFIX});;All files (*)"
+
 _commands = [
     {
         'name': 'browse',
@@ -221,7 +1105,7 @@ _commands = [
                 'icon': 'backward.png',
                 'text': 'Go back',
                 'tip':  'Back to the parent view',
-                'slot': '_dummy',
+                'slot': '_goBack',
                 'init': False
             },
             {
@@ -229,7 +1113,7 @@ _commands = [
                 'icon': 'forward.png',
                 'text': 'Go forward',
                 'tip':  'Go to the child view that has been shown previously',
-                'slot': '_dummy',
+                'slot': '_goForward',
                 'init': False
             },
             {
@@ -258,6 +1142,17 @@ _commands = [
                 'tip':  'Remove the selected entry',
                 'slot': '_dummy',
                 'init': False
+            },
+            {
+                'name': '__sep__'
+            },
+            {
+                'name': 'search',
+                'icon': 'search.png',
+                'text': 'Search...',
+                'tip':  'Search the entries of the current subject',
+                'slot': '_search',
+                'init': False
             }
         ]
     },
@@ -378,6 +1273,13 @@ _commands = [
             {
                 'name': 'next',
                 'key':  'Ctrl+]'
+            },
+            {
+                'name': '__sep__'
+            },
+            {
+                'name': 'search',
+                'key':  'Ctrl+F'
             }
         ]
     }
@@ -0,0 +1,188 @@
+#
+# MIT License
+#
+# Copyright (c) 2019 Keisuke Sehara
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+"""managing the entity trees in a workspace."""
+
+from pathlib import Path as _Path
+from concurrent.futures import ProcessPoolExecutor as _ProcessPoolExecutor, \
+                               as_completed as _as_completed
+
+from . import ids as _ids
+from . import storage as _storage
+from . import trace as _trace
+
+class Registry:
+    """a workspace-wide mapping from uuid to the objects (entities
+    and, optionally, their log entries) in the registered trees.
+
+    the registry keeps itself up to date by observing the root entities.
+    """
+    def __init__(self, entries=True):
+        self._objects = {}
+        self._roots   = []
+        self._entries = entries
+
+    def __len__(self):
+        return len(self._objects)
+
+    def __contains__(self, uuid):
+        return self._key(uuid) in self._objects.keys()
+
+    @staticmethod
+    def _key(uuid):
+        return _ids.as_id(uuid)
+
+    @property
+    def roots(self):
+        return tuple(self._roots)
+
+    def add(self, root):
+        """registers `root` and its descendants."""
+        if root.uuid in self._objects.keys():
+            return
+        self._register_entity(root)
+        self._roots.append(root)
+        root.add_observer(self._changed)
+
+    def remove(self, root):
+        """unregisters `root` and its descendants."""
+        if root not in self._roots:
+            return
+        root.remove_observer(self._changed)
+        self._roots.remove(root)
+        self._unregister_entity(root)
+
+    def resolve(self, uuid):
+        """returns the object with `uuid` (or None)."""
+        return self._objects.get(self._key(uuid), None)
+
+    def _register_entry(self, entry):
+        if entry.is_block():
+            if entry.content is not None:
+                self._register_entity(entry.content)
+        if self._entries == True:
+            self._objects[entry.uuid] = entry
+
+    def _register_entity(self, entity):
+        self._objects[entity.uuid] = entity
+        for entry in entity.logs:
+            self._register_entry(entry)
+
+    def _unregister_entity(self, entity):
+        self._objects.pop(entity.uuid, None)
+        for entry in entity.logs:
+            self._objects.pop(entry.uuid, None)
+            if entry.is_block() and (entry.content is not None):
+                self._unregister_entity(entry.content)
+
+    def _changed(self, event, source, *args):
+        if event == 'insert':
+            for entry in args[0]:
+                self._register_entry(entry)
+
+def _read_journal(path):
+    """reads a journal file in a worker process. the restored tree is sent
+    back to the main process as a whole (i.e. pickled with its links),
+    which is much cheaper than replaying the records there."""
+    sig               = _storage.signature(path)
+    replay, truncated = _storage.read(path)
+    return replay.finish(), replay.records, truncated, sig, len(replay.objects)
+
+class Workspace:
+    """a set of subject journals, loaded in parallel.
+
+    the objects in the loaded trees are registered to `registry`
+    (by default, a Registry of the entities only).
+    """
+    def __init__(self, registry=None):
+        self.registry = Registry(entries=False) if registry is None else registry
+        self.journals = {} # path --> Journal
+        self.errors   = {} # path --> the exception raised while loading
+
+    def is_modified(self, path):
+        """returns whether the file at `path` has to be (re)loaded."""
+        journal = self.journals.get(path, None)
+        if journal is None:
+            return True
+        try:
+            return _storage.signature(path) != journal.signature
+        except OSError:
+            return True
+
+    def load(self, paths, processes=None, progress=None):
+        """loads the journal files in `paths` using a pool of `processes` worker processes.
+
+        files that have not changed since the last load (or save) are skipped,
+        as well as those having unsaved changes in this workspace.
+        `progress(path, done, total)` is called in the main process
+        every time a file has been processed.
+
+        returns the list of the journals that have been (re)loaded.
+        """
+        paths   = [str(_Path(path)) for path in paths]
+        total   = len(paths)
+        done    = 0
+        loaded  = []
+        pending = []
+        for path in paths:
+            journal = self.journals.get(path, None)
+            if (not self.is_modified(path)) or ((journal is not None) and journal.has_changes()):
+                done += 1
+                if progress is not None:
+                    progress(path, done, total)
+            else:
+                pending.append(path)
+        if len(pending) == 0:
+            return loaded
+        with _trace.span('workspace.load', files=len(pending)), \
+                _ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = dict((pool.submit(_read_journal, path), path) for path in pending)
+            for future in _as_completed(futures):
+                path = futures[future]
+                try:
+                    root, written, truncated, sig, live = future.result()
+                    journal = _storage.restore(path, root, written, truncated=truncated,
+                                               sig=sig, live=live)
+                except Exception as e:
+                    self.errors[path] = e
+                else:
+                    self.errors.pop(path, None)
+                    self._replace(path, journal)
+                    loaded.append(journal)
+                done += 1
+                if progress is not None:
+                    progress(path, done, total)
+        return loaded
+
+    def _replace(self, path, journal):
+        previous = self.journals.get(path, None)
+        if previous is not None:
+            previous.close()
+            self.registry.remove(previous.root)
+        self.journals[path] = journal
+        self.registry.add(journal.root)
+
+    @property
+    def subjects(self):
+        return [journal.root for journal in self.journals.values()]
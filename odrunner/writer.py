@@ -0,0 +1,135 @@
+#
+# MIT License
+#
+# Copyright (c) 2019 Keisuke Sehara
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+#
+
+"""logging from worker threads.
+
+producer threads push entries into a LogWriter, which is drained on the GUI
+thread and applied as batched insertions (a single row insertion per target
+and drain), at most once every `interval` milliseconds.
+"""
+
+import time as _time
+import threading as _threading
+from collections import deque as _deque
+
+from qtpy import QtCore as _QtCore
+
+from . import core as _core
+from . import trace as _trace
+
+class LogWriter(_QtCore.QObject):
+    """a thread-safe writer to an Entity or a LogDataModel.
+
+    `push()` and `pushMany()` may be called from any thread. the entries
+    are applied on the thread of the writer (i.e. the GUI thread) through
+    `LogDataModel.insertMany()` or `Entity.extend()`, depending on `target`.
+    """
+    drained = _QtCore.Signal(int)      # the number of entries applied
+    failed  = _QtCore.Signal(str, str) # title, message
+    _wake   = _QtCore.Signal()
+
+    DEFAULT_INTERVAL  = 50    # msec
+    DEFAULT_MAX_BATCH = 10000 # entries per drain
+
+    def __init__(self, target, interval=DEFAULT_INTERVAL, max_batch=DEFAULT_MAX_BATCH,
+                 parent=None):
+        super().__init__(parent=parent)
+        self._target    = target
+        self._interval  = interval
+        self._max_batch = max_batch
+        self._lock      = _threading.Lock()
+        self._queue     = _deque() # (target, entry)
+        self._scheduled = False
+        self._last      = 0.0
+        self._timer     = _QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.drain)
+        # queued to the thread of the writer when emitted by a producer
+        self._wake.connect(self._schedule)
+
+    @property
+    def target(self):
+        return self._target
+
+    def pending(self):
+        """returns the number of the entries yet to be applied."""
+        return len(self._queue)
+
+    def push(self, entry, target=None):
+        """queues `entry` to be inserted to `target` (or the default target)."""
+        self.pushMany((entry,), target=target)
+
+    def pushMany(self, entries, target=None):
+        target = self._target if target is None else target
+        with self._lock:
+            self._queue.extend((target, entry) for entry in entries)
+            wake            = not self._scheduled
+            self._scheduled = True
+        if wake == True:
+            self._wake.emit()
+
+    def _schedule(self):
+        elapsed = (_time.monotonic() - self._last) * 1000
+        self._timer.start(int(max(0, self._interval - elapsed)))
+
+    def drain(self):
+        """applies (up to `max_batch`) queued entries. must be called on the GUI thread."""
+        self._last = _time.monotonic()
+        with self._lock:
+            count = min(len(self._queue), self._max_batch)
+            taken = [self._queue.popleft() for _ in range(count)]
+            more  = len(self._queue) > 0
+            self._scheduled = more
+        if more == True:
+            self._schedule()
+        if count == 0:
+            return
+        with _trace.span('writer.drain', entries=count):
+            # consecutive entries to the same target are inserted at once
+            start = 0
+            for index in range(1, count + 1):
+                if (index == count) or (taken[index][0] is not taken[start][0]):
+                    self._apply(taken[start][0], [entry for _, entry in taken[start:index]])
+                    start = index
+        self.drained.emit(count)
+
+    def _apply(self, target, entries):
+        try:
+            if isinstance(target, _core.Entity):
+                target.extend(entries)
+            else:
+                target.insertMany(entries)
+        except ValueError as e:
+            self.failed.emit("Failed to log", str(e))
+
+    def close(self, flush=True):
+        """stops draining, applying the remaining entries if `flush` is True."""
+        self._timer.stop()
+        if flush == True:
+            while self.pending() > 0:
+                self.drain()
+        self._timer.stop()
+        with self._lock:
+            self._queue.clear()
+            self._scheduled = False